@@ -0,0 +1,221 @@
+"""
+Offline Basemap
+Renders coastlines and country borders from a compact binary dataset, as an
+alternative to the Yandex static maps API.
+
+The dataset is built once from GeoJSON line or polygon files (e.g. Natural
+Earth ``ne_50m_coastline`` and ``ne_50m_admin_0_boundary_lines_land``):
+
+    python basemap.py build basemap.bin coastline:ne_50m_coastline.geojson \\
+        border:ne_50m_admin_0_boundary_lines_land.geojson
+
+File layout (little-endian, every section 4-byte aligned):
+
+    header       magic, version, line/point/reference counts, grid cell size, grid width/height
+    line_start   uint32[lines]     index of the first point of each polyline
+    line_count   uint32[lines]     number of points in each polyline
+    line_layer   uint32[lines]     index into LAYERS
+    line_bbox    float32[lines*4]  min_lon, min_lat, max_lon, max_lat
+    points       float32[points*2] lon, lat
+    cell_offsets uint32[cells+1]   start of each grid cell's slice of cell_refs
+    cell_refs    uint32[refs]      polylines crossing each grid cell
+
+The file is memory-mapped and read through typed ``memoryview`` casts, so
+loading is instant and only the grid cells covering the requested span are
+touched when rendering.
+"""
+
+import json
+import logging
+import math
+import mmap
+import struct
+import sys
+from array import array
+
+from PIL import Image, ImageDraw
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"EQBM"
+VERSION = 1
+HEADER = struct.Struct("<4sIIIIfII")
+# Long polylines are split into chunks so each one has a tight bounding box
+CHUNK_POINTS = 64
+LAYERS = ["coastline", "border"]
+LAYER_STYLES = {
+    "coastline": {"fill": "#4a6f8a", "width": 2},
+    "border": {"fill": "#9a8f9e", "width": 1},
+}
+BACKGROUND = "#f2efe9"
+
+
+def _geometry_lines(geometry):
+    """Yield coordinate lists of every line or polygon ring in a GeoJSON geometry."""
+    kind = geometry["type"]
+    coords = geometry["coordinates"]
+    if kind == "LineString":
+        yield coords
+    elif kind in ("MultiLineString", "Polygon"):
+        yield from coords
+    elif kind == "MultiPolygon":
+        for polygon in coords:
+            yield from polygon
+    elif kind == "GeometryCollection":
+        for part in geometry["geometries"]:
+            yield from _geometry_lines(part)
+
+
+def build(out_path, sources, cell_deg=5.0):
+    """Convert GeoJSON files into the binary basemap format.
+
+    ``sources`` is a list of (layer, path) pairs, layer being one of LAYERS.
+    """
+    if sys.byteorder != "little":
+        raise RuntimeError("Basemap files are little-endian; build them on a little-endian machine")
+    grid_w = int(math.ceil(360 / cell_deg))
+    grid_h = int(math.ceil(180 / cell_deg))
+    line_start, line_count, line_layer = array("I"), array("I"), array("I")
+    line_bbox, points = array("f"), array("f")
+    cells = [[] for _ in range(grid_w * grid_h)]
+
+    def add_line(line, layer_id):
+        line_id = len(line_start)
+        line_start.append(len(points) // 2)
+        line_count.append(len(line))
+        line_layer.append(layer_id)
+        lons = [p[0] for p in line]
+        lats = [p[1] for p in line]
+        bbox = (min(lons), min(lats), max(lons), max(lats))
+        line_bbox.extend(bbox)
+        for lon, lat in zip(lons, lats):
+            points.append(lon)
+            points.append(lat)
+        col0, row0 = _cell(bbox[0], bbox[1], cell_deg, grid_w, grid_h)
+        col1, row1 = _cell(bbox[2], bbox[3], cell_deg, grid_w, grid_h)
+        for row in range(row0, row1 + 1):
+            for col in range(col0, col1 + 1):
+                cells[row * grid_w + col].append(line_id)
+
+    for layer, path in sources:
+        layer_id = LAYERS.index(layer)
+        with open(path, "r") as f:
+            collection = json.load(f)
+        for feature in collection["features"]:
+            if not feature.get("geometry"):
+                continue
+            for line in _geometry_lines(feature["geometry"]):
+                # Consecutive chunks share their boundary point so lines stay connected
+                for start in range(0, len(line) - 1, CHUNK_POINTS - 1):
+                    add_line(line[start:start + CHUNK_POINTS], layer_id)
+        logger.info(f"Loaded {layer} from {path}")
+
+    cell_offsets, cell_refs = array("I", [0]), array("I")
+    for refs in cells:
+        cell_refs.extend(refs)
+        cell_offsets.append(len(cell_refs))
+
+    with open(out_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(line_start), len(points) // 2,
+                            len(cell_refs), cell_deg, grid_w, grid_h))
+        for section in (line_start, line_count, line_layer, line_bbox, points, cell_offsets, cell_refs):
+            section.tofile(f)
+    logger.info(f"Wrote {out_path}: {len(line_start)} lines, {len(points) // 2} points, {len(cell_refs)} cell references")
+
+
+def _cell(lon, lat, cell_deg, grid_w, grid_h):
+    col = min(grid_w - 1, max(0, int((lon + 180) // cell_deg)))
+    row = min(grid_h - 1, max(0, int((lat + 90) // cell_deg)))
+    return col, row
+
+
+class Basemap:
+    """Memory-mapped basemap dataset."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = self._view = memoryview(self._mmap)
+        (magic, version, n_lines, n_points, n_refs,
+         self.cell_deg, self.grid_w, self.grid_h) = HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} basemap file")
+        offset = HEADER.size
+
+        def section(fmt, count):
+            nonlocal offset
+            part = view[offset:offset + count * 4].cast(fmt)
+            offset += count * 4
+            return part
+
+        self.line_start = section("I", n_lines)
+        self.line_count = section("I", n_lines)
+        self.line_layer = section("I", n_lines)
+        self.line_bbox = section("f", n_lines * 4)
+        self.points = section("f", n_points * 2)
+        self.cell_offsets = section("I", self.grid_w * self.grid_h + 1)
+        self.cell_refs = section("I", n_refs)
+        logger.info(f"Mapped basemap {path}: {n_lines} lines, {n_points} points")
+
+    def lines_in(self, min_lon, min_lat, max_lon, max_lat):
+        """Return IDs of polylines whose bounding box intersects the given box."""
+        col0, row0 = _cell(min_lon, min_lat, self.cell_deg, self.grid_w, self.grid_h)
+        col1, row1 = _cell(max_lon, max_lat, self.cell_deg, self.grid_w, self.grid_h)
+        found = set()
+        for row in range(row0, row1 + 1):
+            for col in range(col0, col1 + 1):
+                cell = row * self.grid_w + col
+                found.update(self.cell_refs[self.cell_offsets[cell]:self.cell_offsets[cell + 1]])
+        bbox = self.line_bbox
+        return [
+            i for i in found
+            if bbox[4 * i] <= max_lon and bbox[4 * i + 2] >= min_lon
+            and bbox[4 * i + 1] <= max_lat and bbox[4 * i + 3] >= min_lat
+        ]
+
+    def render(self, bbox, project, size):
+        """Draw all lines within ``bbox`` onto a new image.
+
+        ``bbox`` is (min_lon, min_lat, max_lon, max_lat) and may extend past
+        ±180° near the antimeridian; ``project`` maps lon, lat to image pixels.
+        """
+        min_lon, min_lat, max_lon, max_lat = bbox
+        image = Image.new("RGBA", size, BACKGROUND)
+        drawer = ImageDraw.Draw(image)
+        # Wrapped copies of the world for spans that cross the antimeridian
+        shifts = [0]
+        if min_lon < -180:
+            shifts.append(-360)
+        if max_lon > 180:
+            shifts.append(360)
+        for layer in LAYERS:
+            layer_id = LAYERS.index(layer)
+            style = LAYER_STYLES[layer]
+            for shift in shifts:
+                for i in self.lines_in(max(min_lon - shift, -180), min_lat, min(max_lon - shift, 180), max_lat):
+                    if self.line_layer[i] != layer_id:
+                        continue
+                    start = 2 * self.line_start[i]
+                    coords = self.points[start:start + 2 * self.line_count[i]]
+                    xy = [project(coords[j] + shift, coords[j + 1]) for j in range(0, len(coords), 2)]
+                    drawer.line(xy, fill=style["fill"], width=style["width"])
+        return image
+
+    def close(self):
+        for part in (self.line_start, self.line_count, self.line_layer, self.line_bbox,
+                     self.points, self.cell_offsets, self.cell_refs):
+            part.release()
+        self._view.release()
+        self._mmap.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    if len(sys.argv) < 4 or sys.argv[1] != "build":
+        print("Usage: python basemap.py build <out.bin> <layer>:<file.geojson> [...]")
+        sys.exit(1)
+    build(sys.argv[2], [tuple(arg.split(":", 1)) for arg in sys.argv[3:]])
@@ -0,0 +1,171 @@
+"""
+Browser Pool
+Keeps a small pool of long-lived headless Firefox drivers for the Selenium
+fallback, so browser start-up is paid once per process, not once per event.
+"""
+
+import logging
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.webdriver.firefox.options import Options
+
+logger = logging.getLogger(__name__)
+
+
+def start_firefox():
+    """Start a headless Firefox driver."""
+    logger.info("Starting Firefox driver")
+    options = Options()
+    options.add_argument("--no-sandbox")
+    options.add_argument("--headless")
+    options.add_argument("--disable-dev-shm-usage")
+    return webdriver.Firefox(options=options)
+
+
+def process_tree_rss_mb(pid):
+    """Return the resident memory of a process and its children in MB (Linux only)."""
+    if not pid or not os.path.isdir("/proc"):
+        return None
+    parents = {}
+    rss_pages = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name may contain spaces, so split after its closing parenthesis
+        fields = stat[stat.rindex(")") + 2:].split()
+        parents[int(entry)] = int(fields[1])
+        rss_pages[int(entry)] = int(fields[21])
+    tree = {int(pid)}
+    changed = True
+    while changed:
+        children = {p for p, ppid in parents.items() if ppid in tree and p not in tree}
+        tree |= children
+        changed = bool(children)
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    return sum(rss_pages.get(p, 0) for p in tree) * page_size / (1024 * 1024)
+
+
+class PooledDriver:
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+
+    @property
+    def browser_pid(self):
+        return self.driver.capabilities.get("moz:processID")
+
+    def is_healthy(self):
+        try:
+            return self.driver.execute_script("return 1") == 1
+        except Exception as e:
+            logger.warning(f"Driver health check failed: {str(e)}")
+            return False
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception as e:
+            logger.warning(f"Failed to quit driver: {str(e)}")
+
+
+class BrowserPool:
+    """Thread-safe pool of warmed headless drivers.
+
+    Drivers are health-checked when taken from the pool and after a failed
+    page, and recycled after ``max_pages`` page loads or when the browser
+    process tree grows past ``max_rss_mb``.
+    """
+
+    def __init__(self, size=1, max_pages=50, max_rss_mb=1024, factory=start_firefox):
+        self.size = size
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.factory = factory
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+
+    def warm(self):
+        """Start drivers up to the pool size ahead of the first event."""
+        with self._lock:
+            missing = self.size - self._created
+            self._created += missing
+        for started in range(missing):
+            try:
+                self._idle.put(PooledDriver(self.factory()))
+            except Exception:
+                # Give back this slot and the ones not reached yet
+                with self._lock:
+                    self._created -= missing - started
+                raise
+        logger.info(f"Browser pool warmed with {self.size} driver(s)")
+
+    def _acquire(self, timeout):
+        with self._lock:
+            can_create = self._idle.empty() and self._created < self.size
+            if can_create:
+                self._created += 1
+        if not can_create:
+            pooled = self._idle.get(timeout=timeout)
+            if pooled.is_healthy():
+                return pooled
+            logger.info("Replacing unhealthy driver")
+            pooled.quit()
+        try:
+            return PooledDriver(self.factory())
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def _release(self, pooled, failed=False):
+        pooled.pages += 1
+        recycle = failed or self._closed or pooled.pages >= self.max_pages
+        if not recycle and self.max_rss_mb:
+            rss = process_tree_rss_mb(pooled.browser_pid)
+            if rss is not None and rss > self.max_rss_mb:
+                logger.info(f"Recycling driver using {rss:.0f} MB (limit {self.max_rss_mb} MB)")
+                recycle = True
+        if recycle:
+            pooled.quit()
+            with self._lock:
+                self._created -= 1
+        else:
+            self._idle.put(pooled)
+
+    @contextmanager
+    def driver(self, timeout=120):
+        """Borrow a driver from the pool for the duration of a ``with`` block."""
+        pooled = self._acquire(timeout)
+        failed = False
+        try:
+            yield pooled.driver
+        except Exception:
+            # Page timeouts and missing elements leave the browser usable; only a
+            # driver that no longer answers is thrown away
+            failed = not pooled.is_healthy()
+            raise
+        finally:
+            self._release(pooled, failed)
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            pooled.quit()
+            with self._lock:
+                self._created -= 1
+        logger.info("Browser pool closed")
@@ -13,4 +13,92 @@ ENVIRONMENT = os.getenv("ENVIRONMENT", "production")
 # Earthquake monitoring settings
 UPDATE_FREQUENCY_MINUTES = int(os.getenv("UPDATE_FREQUENCY_MINUTES", 5))
 MAGNITUDE_THRESHOLD = float(os.getenv("MAGNITUDE_THRESHOLD", 4.0))
-USGS_API_URL = os.getenv("USGS_API_URL", "https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary/2.5_day.geojson")
\ No newline at end of file
+USGS_API_URL = os.getenv("USGS_API_URL", "https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary/2.5_day.geojson")
+SEEN_EVENTS_RETENTION_HOURS = float(os.getenv("SEEN_EVENTS_RETENTION_HOURS", 24 * 31))
+# Seen-event index and feed poll position
+STATE_FILE = os.getenv("STATE_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "state.json"))
+
+# USGS feed polling: "summary" uses conditional GETs on USGS_API_URL,
+# "fdsn" queries USGS_FDSN_URL for events updated since the last poll
+USGS_FEED_MODE = os.getenv("USGS_FEED_MODE", "summary")
+USGS_FDSN_URL = os.getenv("USGS_FDSN_URL", "https://earthquake.usgs.gov/fdsnws/event/1/query")
+USGS_FDSN_LOOKBACK_HOURS = float(os.getenv("USGS_FDSN_LOOKBACK_HOURS", 24))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", 30))
+
+# Event enrichment: detail GeoJSON and geoserve places over plain HTTP,
+# with Selenium scraping of the region-info page as an optional fallback
+USGS_DETAIL_URL = os.getenv("USGS_DETAIL_URL", "https://earthquake.usgs.gov/earthquakes/feed/v1.0/detail/{event_id}.geojson")
+GEOSERVE_PLACES_URL = os.getenv("GEOSERVE_PLACES_URL", "https://earthquake.usgs.gov/ws/geoserve/places.json")
+SELENIUM_FALLBACK = os.getenv("SELENIUM_FALLBACK", "true").lower() in ("1", "true", "yes")
+
+# Browser pool for the Selenium fallback
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", 1))
+BROWSER_MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", 50))
+BROWSER_MAX_RSS_MB = int(os.getenv("BROWSER_MAX_RSS_MB", 1024))
+BROWSER_POOL_PREWARM = os.getenv("BROWSER_POOL_PREWARM", "false").lower() in ("1", "true", "yes")
+
+# Selenium extraction: "script" reads all fields in one execute_script call,
+# "xpath" waits for each field separately
+SCRAPE_MODE = os.getenv("SCRAPE_MODE", "script")
+SCRAPE_TIMEOUT_SECONDS = float(os.getenv("SCRAPE_TIMEOUT_SECONDS", 30))
+
+# Event processing: "serial" handles one event at a time on a schedule,
+# "async" runs the staged asyncio pipeline from pipeline.py
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "serial")
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", 20))
+PIPELINE_ENRICH_WORKERS = int(os.getenv("PIPELINE_ENRICH_WORKERS", 4))
+PIPELINE_MAP_WORKERS = int(os.getenv("PIPELINE_MAP_WORKERS", 4))
+PIPELINE_RENDER_WORKERS = int(os.getenv("PIPELINE_RENDER_WORKERS", 1))
+PIPELINE_PUBLISH_WORKERS = int(os.getenv("PIPELINE_PUBLISH_WORKERS", 1))
+
+# Rendered map encoding: PNG, JPEG or WEBP
+MAP_IMAGE_FORMAT = os.getenv("MAP_IMAGE_FORMAT", "PNG")
+MAP_IMAGE_QUALITY = int(os.getenv("MAP_IMAGE_QUALITY", 85))
+
+# Basemaps: Yandex static maps with a disk LRU cache keyed by a snapped center
+YANDEX_MAPS_URL = os.getenv("YANDEX_MAPS_URL", "https://static-maps.yandex.ru/1.x/")
+MAP_CACHE_DIR = os.getenv("MAP_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "map_cache"))
+MAP_CACHE_MAX_MB = float(os.getenv("MAP_CACHE_MAX_MB", 200))
+MAP_CACHE_GRID_PX = int(os.getenv("MAP_CACHE_GRID_PX", 128))
+
+# Map backend: "yandex", "offline" (basemap.py dataset) or "auto" (Yandex, then offline)
+MAP_BACKEND = os.getenv("MAP_BACKEND", "auto")
+BASEMAP_FILE = os.getenv("BASEMAP_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "basemap.bin"))
+
+# Event ingestion: "schedule" polls every UPDATE_FREQUENCY_MINUTES, "adaptive"
+# polls between POLL_MIN_SECONDS and POLL_MAX_SECONDS depending on activity,
+# "stream" listens on STREAM_URL and polls adaptively while it is down
+INGEST_MODE = os.getenv("INGEST_MODE", "schedule")
+STREAM_URL = os.getenv("STREAM_URL")
+POLL_MIN_SECONDS = float(os.getenv("POLL_MIN_SECONDS", 20))
+POLL_MAX_SECONDS = float(os.getenv("POLL_MAX_SECONDS", UPDATE_FREQUENCY_MINUTES * 60))
+
+# Telegram publishing queue
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", 30))
+TELEGRAM_CHAT_RATE_PER_MINUTE = float(os.getenv("TELEGRAM_CHAT_RATE_PER_MINUTE", 20))
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", 5))
+# "none" sends every post separately, "digest" merges waiting text posts into
+# one message, "media_group" sends waiting posts with maps as one album
+TELEGRAM_BATCH_MODE = os.getenv("TELEGRAM_BATCH_MODE", "none")
+TELEGRAM_BATCH_WINDOW_SECONDS = float(os.getenv("TELEGRAM_BATCH_WINDOW_SECONDS", 2))
+
+# Posted messages, kept so revised events can be edited in place
+POSTS_DB_FILE = os.getenv("POSTS_DB_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "posts.db"))
+POST_TRACKING_DAYS = float(os.getenv("POST_TRACKING_DAYS", 30))
+
+# History of every event seen in the feed, used for "Nth quake in this area" context
+HISTORY_DB_FILE = os.getenv("HISTORY_DB_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "history.db"))
+HISTORY_RADIUS_KM = float(os.getenv("HISTORY_RADIUS_KM", 100))
+HISTORY_DAYS = float(os.getenv("HISTORY_DAYS", 7))
+
+# Local GeoNames gazetteer for nearby places (gazetteer.py); geoserve is used when the file is missing
+GAZETTEER_FILE = os.getenv("GAZETTEER_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "gazetteer.npz"))
+
+# Per-chat regions and magnitude thresholds (subscriptions.py); without the file
+# every event above MAGNITUDE_THRESHOLD goes to TELEGRAM_CHANNEL_ID
+SUBSCRIPTIONS_FILE = os.getenv("SUBSCRIPTIONS_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "subscriptions.json"))
+SUBSCRIPTIONS_CELL_DEG = float(os.getenv("SUBSCRIPTIONS_CELL_DEG", 2))
+
+# Prometheus metrics endpoint (metrics.py); 0 disables it
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
@@ -1,12 +1,28 @@
-import requests
+import asyncio
 import logging
 import schedule
+import threading
 import time
-import subprocess
 import os
-import sys
 
-from config import USGS_API_URL, MAGNITUDE_THRESHOLD, UPDATE_FREQUENCY_MINUTES
+from config import (
+    USGS_API_URL, MAGNITUDE_THRESHOLD, UPDATE_FREQUENCY_MINUTES,
+    SEEN_EVENTS_RETENTION_HOURS, STATE_FILE, USGS_FEED_MODE, USGS_FDSN_URL,
+    USGS_FDSN_LOOKBACK_HOURS, HTTP_TIMEOUT_SECONDS, SELENIUM_FALLBACK,
+    BROWSER_POOL_PREWARM, PIPELINE_MODE, PIPELINE_QUEUE_SIZE,
+    PIPELINE_ENRICH_WORKERS, PIPELINE_MAP_WORKERS, PIPELINE_RENDER_WORKERS,
+    PIPELINE_PUBLISH_WORKERS, INGEST_MODE, STREAM_URL, POLL_MIN_SECONDS,
+    POLL_MAX_SECONDS, SUBSCRIPTIONS_FILE, SUBSCRIPTIONS_CELL_DEG, METRICS_PORT
+)
+import metrics
+import monolith
+from ingest import AdaptivePoller, Ingestor, StreamSource
+from pipeline import Pipeline
+from event import Event
+from seen_events import SeenEventIndex, event_ids
+from state_store import StateStore
+from subscriptions import load_subscriptions
+from usgs_feed import FeedClient
 
 # Настройка логирования
 logging.basicConfig(
@@ -17,87 +33,195 @@ logger = logging.getLogger(__name__)
 
 # Пути к файлам
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-COORDINATES_FILE = os.path.join(BASE_DIR, "coordinates.txt")
-LAST_EVENT_FILE = os.path.join(BASE_DIR, "last_event.txt")
-LAST_MAGNITUDE_FILE = os.path.join(BASE_DIR, "last_magnitude.txt")
-MONOLITH_SCRIPT = os.path.join(BASE_DIR, "monolith.py")
 
-def check_earthquakes():
-    logger.info("Fetching latest earthquake data")
+state = StateStore(STATE_FILE)
+state_lock = threading.Lock()
+seen_events = SeenEventIndex(SEEN_EVENTS_RETENTION_HOURS, state.get("seen_events"))
+# Подписки с регионами; без файла всё публикуется в основной канал
+subscriptions = None
+if SUBSCRIPTIONS_FILE and os.path.exists(SUBSCRIPTIONS_FILE):
+    subscriptions = load_subscriptions(SUBSCRIPTIONS_FILE, SUBSCRIPTIONS_CELL_DEG)
+# Порог ленты — самый низкий порог среди всех подписок
+if subscriptions and subscriptions.min_magnitude is not None:
+    feed_threshold = subscriptions.min_magnitude
+else:
+    feed_threshold = MAGNITUDE_THRESHOLD
+
+feed_client = FeedClient(
+    USGS_API_URL,
+    mode=USGS_FEED_MODE,
+    fdsn_url=USGS_FDSN_URL,
+    min_magnitude=feed_threshold,
+    lookback_hours=USGS_FDSN_LOOKBACK_HOURS,
+    timeout=HTTP_TIMEOUT_SECONDS
+)
+feed_client.load_state(state.get("feed"))
+
+def save_state():
+    """Атомарно сохраняет индекс событий и позицию опроса ленты."""
+    state.set("seen_events", seen_events.to_dict())
+    state.set("feed", feed_client.dump_state())
+    state.save()
+
+def select_new_events(features, index):
+    """Возвращает новые события выше порога магнитуды в хронологическом порядке."""
+    new_events = []
+    for quake in features:
+        magnitude = quake["properties"]["mag"]
+        if magnitude is None or magnitude < feed_threshold:
+            continue
+        if index.is_seen(quake):
+            continue
+        new_events.append(quake)
+    new_events.sort(key=lambda q: q["properties"]["time"] or 0)
+    return new_events
+
+def has_valid_coordinates(quake):
+    longitude, latitude = quake["geometry"]["coordinates"][:2]
+    # Валидация координат
+    if not (-180 <= longitude <= 180):
+        logger.error(f"Invalid longitude: {longitude}")
+        return False
+    if not (-90 <= latitude <= 90):
+        logger.error(f"Invalid latitude: {latitude}")
+        return False
+    return True
+
+def is_material_revision(tracked, event):
+    """Проверяет, заметно ли изменились магнитуда, координаты или глубина события."""
+    if tracked["magnitude"] is None or event.magnitude is None:
+        return tracked["magnitude"] != event.magnitude
+    return (
+        round(event.magnitude, 1) != round(tracked["magnitude"], 1)
+        or abs(event.latitude - tracked["latitude"]) >= 0.01
+        or abs(event.longitude - tracked["longitude"]) >= 0.01
+        or abs((event.depth or 0) - (tracked["depth"] or 0)) >= 1
+    )
+
+def select_revised_events(features):
+    """Возвращает уже опубликованные события, которые USGS с тех пор пересмотрел.
+
+    Для каждой уже виденной фичи делается один запрос по индексу реестра
+    публикаций; новая отметка updated сохраняется сразу, поэтому каждая
+    ревизия обрабатывается один раз.
+    """
+    registry = monolith.get_post_registry()
+    revised = []
+    for quake in features:
+        if not seen_events.is_seen(quake):
+            continue
+        try:
+            tracked = registry.find(event_ids(quake))
+            updated = quake["properties"].get("updated") or 0
+            if tracked is None or updated <= tracked["updated"] or not has_valid_coordinates(quake):
+                continue
+            event = Event.from_feature(quake)
+            # Сообщения записаны под ID, с которым событие было опубликовано
+            event.id = tracked["event_id"]
+            registry.record_event(event)
+        except Exception as e:
+            logger.error(f"Failed to check {quake.get('id')} for revisions: {str(e)}")
+            continue
+        if is_material_revision(tracked, event):
+            event.revision = True
+            revised.append(event)
+    return revised
+
+def route_events(events):
+    """Назначает событиям чаты подписчиков и отбрасывает события без подписчиков."""
+    if subscriptions is None:
+        return events
+    routed = []
+    for event in events:
+        event.chat_ids = subscriptions.route(event.latitude, event.longitude, event.magnitude)
+        if event.chat_ids:
+            routed.append(event)
+        else:
+            logger.info(f"No subscribers for {event.id} (M{event.magnitude})")
+    return routed
+
+def accept_features(features):
+    """Отбирает новые и пересмотренные события из списка фич и помечает их как обработанные.
+
+    Вызывается и из опроса ленты, и из потока событий, поэтому работа с
+    индексом и файлом состояния идёт под блокировкой.
+    """
+    # История хранит все события ленты, а не только опубликованные
     try:
-        response = requests.get(USGS_API_URL)
-        response.raise_for_status()
-        data = response.json()
-        
-        # Проверяем, есть ли землетрясения
-        if not data["features"]:
-            logger.info("No earthquakes found")
-            return
-        
-        # Находим последнее землетрясение
-        latest_quake = data["features"][0]
-        magnitude = latest_quake["properties"]["mag"]
-        place = latest_quake["properties"]["place"]
-        event_url = latest_quake["properties"]["url"]
-        
-        logger.debug(f"Found earthquake: {place}, magnitude: {magnitude}")
-        
-        # Проверяем порог магнитуды
-        if magnitude < MAGNITUDE_THRESHOLD:
-            logger.info(f"Earthquake magnitude {magnitude} below threshold {MAGNITUDE_THRESHOLD}, skipping")
-            return
-        
-        # Сохраняем координаты
-        coordinates = latest_quake["geometry"]["coordinates"]
-        longitude, latitude = coordinates[0], coordinates[1]
-        # Валидация координат
-        if not (-180 <= longitude <= 180):
-            logger.error(f"Invalid longitude: {longitude}")
-            return
-        if not (-90 <= latitude <= 90):
-            logger.error(f"Invalid latitude: {latitude}")
-            return
-        logger.info(f"Saving coordinates: latitude={latitude}, longitude={longitude}")
-        with open(COORDINATES_FILE, "w") as f:
-            f.write(f"{latitude},{longitude}")
-        logger.debug(f"Successfully saved content to {COORDINATES_FILE}")
-        
-        # Проверяем, новое ли это событие
-        logger.info("Checking if this is a new event")
-        last_event = None
-        if os.path.exists(LAST_EVENT_FILE):
-            with open(LAST_EVENT_FILE, "r") as f:
-                last_event = f.read().strip()
-        
-        if last_event != event_url:
-            logger.info("Processing new event")
-            with open(LAST_EVENT_FILE, "w") as f:
-                f.write(event_url)
-            with open(LAST_MAGNITUDE_FILE, "w") as f:
-                f.write(str(magnitude))
-            
-            logger.info(f"Processing new earthquake: {place} (M{magnitude})")
-            logger.info(f"Using Python executable: {sys.executable}")
-            logger.info(f"Running: {sys.executable} {MONOLITH_SCRIPT}")
-            
-            try:
-                result = subprocess.run(
-                    [sys.executable, MONOLITH_SCRIPT],
-                    capture_output=True,
-                    text=True,
-                    check=True
-                )
-                logger.info("Subprocess completed successfully")
-            except subprocess.CalledProcessError as e:
-                logger.error(f"Subprocess error code: {e.returncode}")
-                logger.error(f"Subprocess output: {e.stdout}")
-                logger.error(f"Subprocess error: {e.stderr}")
-                # Сохраняем последнее событие, чтобы избежать повторов
-                with open(LAST_EVENT_FILE, "w") as f:
-                    f.write(event_url)
+        monolith.get_history().record(features)
+    except Exception as e:
+        logger.error(f"Failed to record event history: {str(e)}")
+    
+    with state_lock:
+        # При первом запуске помечаем всю ленту как обработанную и публикуем
+        # только последнее событие, чтобы не отправить в канал весь архив
+        if seen_events.is_empty():
+            logger.info("Seen-event index is empty, seeding it from the current feed")
+            new_events = select_new_events(features, seen_events)[-1:]
+            for quake in features:
+                if quake not in new_events:
+                    seen_events.add(quake)
+            revised_events = []
         else:
-            logger.info("No new earthquake event")
-            
+            # Сбой реестра публикаций не должен мешать отбору новых событий
+            try:
+                revised_events = select_revised_events(features)
+            except Exception as e:
+                logger.error(f"Failed to check for revised events: {str(e)}")
+                revised_events = []
+            new_events = select_new_events(features, seen_events)
+        
+        # Помечаем события до обработки, чтобы избежать повторов при сбое
+        for quake in new_events:
+            seen_events.add(quake)
+        save_state()
+    
+    if revised_events:
+        logger.info(f"Found {len(revised_events)} revised earthquake event(s)")
+    if not new_events:
+        logger.info("No new earthquake event")
+        return revised_events
+    
+    logger.info(f"Found {len(new_events)} new earthquake event(s)")
+    events = [Event.from_feature(quake) for quake in new_events if has_valid_coordinates(quake)]
+    return route_events(events) + revised_events
+
+def collect_new_events():
+    """Опрашивает ленту USGS и возвращает новые события, помечая их как обработанные."""
+    logger.info("Fetching latest earthquake data")
+    features = feed_client.fetch()
+    
+    # Лента не изменилась с прошлого опроса
+    if features is None:
+        return []
+    
+    # Проверяем, есть ли землетрясения
+    if not features:
+        logger.info("No earthquakes found")
+        with state_lock:
+            save_state()
+        return []
+    
+    events = accept_features(features)
+    # Время загрузки и разбора ленты относится ко всем найденным в ней событиям
+    for event in events:
+        event.timings.update(feed_client.last_timings)
+    return events
+
+def process_earthquake(event):
+    logger.info(f"Processing {'revised' if event.revision else 'new'} earthquake: {event.place} (M{event.magnitude})")
+
+    # Обрабатываем событие в этом же процессе, чтобы переиспользовать пул браузеров
+    try:
+        monolith.main(event)
+        logger.info("Event processed successfully")
+    except Exception as e:
+        logger.error(f"Failed to process event {event.url}: {str(e)}")
+
+def check_earthquakes():
+    try:
+        for event in collect_new_events():
+            process_earthquake(event)
     except Exception as e:
         logger.error(f"Error fetching earthquake data: {str(e)}")
 
@@ -105,16 +229,58 @@ if __name__ == "__main__":
     logger.info(f"Script directory: {BASE_DIR}")
     logger.info(f"Current working directory: {os.getcwd()}")
     logger.info(f"BASE_DIR: {BASE_DIR}")
-    logger.info(f"COORDINATES_FILE: {COORDINATES_FILE}")
-    logger.info(f"LAST_EVENT_FILE: {LAST_EVENT_FILE}")
-    logger.info(f"LAST_MAGNITUDE_FILE: {LAST_MAGNITUDE_FILE}")
-    logger.info(f"MONOLITH_SCRIPT: {MONOLITH_SCRIPT}")
-    logger.info(f"MONOLITH_SCRIPT exists: {os.path.exists(MONOLITH_SCRIPT)}")
+    logger.info(f"STATE_FILE: {STATE_FILE}")
+    logger.info(f"USGS_FEED_MODE: {USGS_FEED_MODE}")
+    logger.info(f"PIPELINE_MODE: {PIPELINE_MODE}")
+    logger.info(f"INGEST_MODE: {INGEST_MODE}")
+    logger.info(f"Subscriptions: {len(subscriptions.chat_ids) if subscriptions else 0} chat(s), feed threshold M{feed_threshold}")
     logger.info("Starting earthquake monitoring script")
+
+    # Без адреса потока StreamSource бесконечно переподключался бы в никуда
+    if INGEST_MODE == "stream" and not STREAM_URL:
+        logger.error("INGEST_MODE=stream requires STREAM_URL to be set")
+        raise SystemExit(1)
+
+    if METRICS_PORT:
+        metrics.start_server(METRICS_PORT)
     
-    # Настройка расписания
-    schedule.every(UPDATE_FREQUENCY_MINUTES).minutes.do(check_earthquakes)
+    # Запускаем браузеры заранее, если Selenium-скрапинг используется постоянно
+    if SELENIUM_FALLBACK and BROWSER_POOL_PREWARM:
+        try:
+            monolith.get_browser_pool().warm()
+        except Exception as e:
+            logger.error(f"Failed to warm browser pool: {str(e)}")
     
-    while True:
-        schedule.run_pending()
-        time.sleep(60)
\ No newline at end of file
+    # Источники событий: поток и/или адаптивный опрос вместо фиксированного расписания
+    ingestor = None
+    if INGEST_MODE in ("stream", "adaptive"):
+        stream = StreamSource(STREAM_URL) if INGEST_MODE == "stream" else None
+        ingestor = Ingestor(
+            collect_new_events,
+            accept_features,
+            AdaptivePoller(POLL_MIN_SECONDS, POLL_MAX_SECONDS),
+            stream=stream
+        ).start()
+    
+    if PIPELINE_MODE == "async":
+        pipeline = Pipeline(
+            ingestor.next_batch if ingestor else collect_new_events,
+            poll_interval=0 if ingestor else UPDATE_FREQUENCY_MINUTES * 60,
+            queue_size=PIPELINE_QUEUE_SIZE,
+            enrich_workers=PIPELINE_ENRICH_WORKERS,
+            map_workers=PIPELINE_MAP_WORKERS,
+            render_workers=PIPELINE_RENDER_WORKERS,
+            publish_workers=PIPELINE_PUBLISH_WORKERS
+        )
+        asyncio.run(pipeline.run())
+    elif ingestor:
+        for events in ingestor.batches():
+            for event in events:
+                process_earthquake(event)
+    else:
+        # Настройка расписания
+        schedule.every(UPDATE_FREQUENCY_MINUTES).minutes.do(check_earthquakes)
+        
+        while True:
+            schedule.run_pending()
+            time.sleep(60)
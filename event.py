@@ -0,0 +1,54 @@
+from dataclasses import dataclass, field
+
+
+@dataclass
+class Event:
+    """An earthquake travelling through the processing pipeline.
+
+    Built from a USGS GeoJSON feature (summary feed, FDSN query or detail
+    endpoint); later stages fill in ``details``, ``map_bytes`` and ``photo``.
+    ``revision`` marks an update to an event that has already been posted;
+    ``chat_ids`` are the subscribed chats to post it to (None means the
+    default channel). ``timings`` holds the seconds spent in each processing
+    stage, see ``metrics.py``.
+    """
+
+    id: str
+    url: str
+    magnitude: float
+    place: str
+    latitude: float
+    longitude: float
+    depth: float
+    time: int
+    updated: int
+    ids: tuple = ()
+    revision: bool = False
+    chat_ids: list = None
+    timings: dict = field(default_factory=dict, repr=False)
+    details: dict = field(default=None, repr=False)
+    map_bytes: bytes = field(default=None, repr=False)
+    photo: bytes = field(default=None, repr=False)
+
+    @classmethod
+    def from_feature(cls, feature):
+        props = feature["properties"]
+        longitude, latitude, depth = feature["geometry"]["coordinates"][:3]
+        ids = {feature["id"]} | {i for i in (props.get("ids") or "").split(",") if i}
+        return cls(
+            id=feature["id"],
+            url=props["url"],
+            magnitude=props["mag"],
+            place=props["place"],
+            latitude=latitude,
+            longitude=longitude,
+            depth=depth,
+            time=props["time"],
+            updated=props.get("updated") or props["time"],
+            ids=tuple(sorted(ids)),
+        )
+
+    @property
+    def long_lat(self):
+        """Coordinates as the "lat,lon" string expected by map2.make_a_map."""
+        return f"{self.latitude},{self.longitude}"
@@ -0,0 +1,132 @@
+"""
+Event details over plain HTTP.
+Builds the same fields the USGS region-info page shows (time, coordinates,
+depth, nearby places) from the event detail GeoJSON, without starting a
+browser. Nearby places come from the local gazetteer when GAZETTEER_FILE
+exists, otherwise from the geoserve places service.
+"""
+
+import logging
+import os
+from datetime import datetime, timezone
+from functools import lru_cache
+
+import requests
+
+from config import USGS_DETAIL_URL, GEOSERVE_PLACES_URL, HTTP_TIMEOUT_SECONDS, GAZETTEER_FILE
+
+logger = logging.getLogger(__name__)
+
+KM_PER_MILE = 1.609344
+COMPASS_POINTS = [
+    "N", "NNE", "NE", "ENE", "E", "ESE", "SE", "SSE",
+    "S", "SSW", "SW", "WSW", "W", "WNW", "NW", "NNW"
+]
+
+session = requests.Session()
+
+
+def event_id_from_url(event_url):
+    """Extract the event ID from a USGS event page URL."""
+    return event_url.rstrip("/").split("/")[-1]
+
+
+def compass_direction(azimuth):
+    return COMPASS_POINTS[int((azimuth % 360) / 22.5 + 0.5) % 16]
+
+
+def format_time(ms):
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S (UTC)")
+
+
+def format_coordinates(latitude, longitude):
+    lat_hemisphere = "N" if latitude >= 0 else "S"
+    lon_hemisphere = "E" if longitude >= 0 else "W"
+    return f"{abs(latitude):.3f}°{lat_hemisphere} {abs(longitude):.3f}°{lon_hemisphere}"
+
+
+def format_nearby(name, region, distance_km, azimuth, population):
+    """Build the city/distance/population strings used in posts."""
+    city = f"{name}, {region}" if region else name
+    distance = f"{distance_km:.1f} km ({distance_km / KM_PER_MILE:.1f} mi)"
+    if azimuth is not None:
+        distance += f" {compass_direction(azimuth)}"
+    return {"city": city, "distance": distance, "population": f"Population: {population:,}"}
+
+
+def format_place(place):
+    """Convert a geoserve place into the strings used in posts."""
+    props = place["properties"]
+    return format_nearby(
+        props["name"],
+        props.get("admin1_name") or props.get("country_name"),
+        float(props["distance"]),
+        float(props["azimuth"]) if props.get("azimuth") is not None else None,
+        int(props.get("population") or 0)
+    )
+
+
+@lru_cache(maxsize=None)
+def get_gazetteer():
+    """Load the local gazetteer once, or return None if it is not available."""
+    if not GAZETTEER_FILE or not os.path.exists(GAZETTEER_FILE):
+        return None
+    try:
+        from gazetteer import Gazetteer
+        return Gazetteer(GAZETTEER_FILE)
+    except Exception as e:
+        logger.error(f"Failed to load gazetteer {GAZETTEER_FILE}: {str(e)}")
+        return None
+
+
+def fetch_detail(event_id):
+    url = USGS_DETAIL_URL.format(event_id=event_id)
+    logger.info(f"Fetching event detail from {url}")
+    response = session.get(url, timeout=HTTP_TIMEOUT_SECONDS)
+    response.raise_for_status()
+    return response.json()
+
+
+def nearby_places(latitude, longitude, limit=5):
+    """Return the nearest places, from the local gazetteer if loaded, else from geoserve."""
+    gazetteer = get_gazetteer()
+    if gazetteer is None:
+        return fetch_nearby_places(latitude, longitude, limit)
+    return [
+        format_nearby(p["name"], p["region"], p["distance_km"], p["azimuth"], p["population"])
+        for p in gazetteer.nearest(latitude, longitude, limit)
+    ]
+
+
+def fetch_nearby_places(latitude, longitude, limit=5):
+    logger.info(f"Fetching nearby places for {latitude},{longitude}")
+    response = session.get(
+        GEOSERVE_PLACES_URL,
+        params={"latitude": latitude, "longitude": longitude, "type": "event"},
+        timeout=HTTP_TIMEOUT_SECONDS
+    )
+    response.raise_for_status()
+    places = response.json()["event"]["features"]
+    return [format_place(place) for place in places[:limit]]
+
+
+def fetch_event_details(event_url):
+    """Return title, time, coordinates, depth and nearby places for an event.
+
+    The result has the same shape as ``monolith.scrape_region_info``.
+    """
+    detail = fetch_detail(event_id_from_url(event_url))
+    props = detail["properties"]
+    longitude, latitude, depth_km = detail["geometry"]["coordinates"][:3]
+    try:
+        nearby = nearby_places(latitude, longitude)
+    except Exception as e:
+        logger.warning(f"Failed to fetch nearby places: {str(e)}")
+        nearby = []
+    return {
+        "title": props["title"],
+        "time": format_time(props["time"]),
+        "coordinates": format_coordinates(latitude, longitude),
+        "depth": f"{depth_km:.1f} km depth",
+        "nearby": nearby
+    }
@@ -0,0 +1,192 @@
+"""
+Gazetteer
+Nearest populated places to an epicenter from a local copy of GeoNames.
+
+Places are stored as unit vectors on the sphere in NumPy arrays sorted by
+latitude, so the k nearest places to a point are the k largest dot products
+with the point's own unit vector. A query only looks at a latitude band
+around the point (a contiguous slice of the arrays): one matrix-vector
+product and an ``argpartition`` over the band, with no per-place Python
+work. The band is widened until the k-th nearest place is closer than the
+band edge, which makes the result exact. ``nearest_many`` answers many
+epicenters at once with one matrix product per latitude band.
+
+The dataset is built from a GeoNames dump such as ``cities1000.txt`` or
+``cities15000.txt`` (https://download.geonames.org/export/dump/), optionally
+with ``admin1CodesASCII.txt`` for region names:
+
+    python gazetteer.py build gazetteer.npz cities15000.txt [admin1CodesASCII.txt]
+"""
+
+import csv
+import logging
+import math
+import sys
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0
+# Half-width of the first latitude band searched; doubled until it holds the answer
+INITIAL_BAND_DEG = 2.0
+# Height of the latitude rows nearest_many batches queries by; the shared slice
+# of a row is this much wider than the band of a single query
+BATCH_ROW_DEG = INITIAL_BAND_DEG / 4
+
+
+def unit_vectors(latitudes, longitudes):
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def chord_to_km(dots):
+    # Half the chord length gives the angle via arcsin, which stays accurate for nearby places
+    chord = np.sqrt(np.clip(2.0 - 2.0 * dots, 0.0, 4.0))
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chord / 2.0, 1.0))
+
+
+def bearing(from_lat, from_lon, to_lat, to_lon):
+    """Initial bearing in degrees from one point to another."""
+    from_lat, from_lon, to_lat, to_lon = map(math.radians, (from_lat, from_lon, to_lat, to_lon))
+    dlon = to_lon - from_lon
+    x = math.sin(dlon) * math.cos(to_lat)
+    y = math.cos(from_lat) * math.sin(to_lat) - math.sin(from_lat) * math.cos(to_lat) * math.cos(dlon)
+    return math.degrees(math.atan2(x, y)) % 360
+
+
+def build(out_path, places_path, admin1_path=None):
+    """Convert a GeoNames places dump into the compact gazetteer file."""
+    admin1 = {}
+    if admin1_path:
+        with open(admin1_path, "r", encoding="utf-8") as f:
+            for row in csv.reader(f, delimiter="\t", quoting=csv.QUOTE_NONE):
+                admin1[row[0]] = row[1]
+    names, regions, latitudes, longitudes, populations = [], [], [], [], []
+    with open(places_path, "r", encoding="utf-8") as f:
+        for row in csv.reader(f, delimiter="\t", quoting=csv.QUOTE_NONE):
+            # GeoNames columns: name = 1, latitude = 4, longitude = 5, feature class = 6,
+            # country code = 8, admin1 code = 10, population = 14
+            if len(row) < 15 or row[6] != "P":
+                continue
+            names.append(row[1])
+            regions.append(admin1.get(f"{row[8]}.{row[10]}", row[8]))
+            latitudes.append(float(row[4]))
+            longitudes.append(float(row[5]))
+            populations.append(int(row[14] or 0))
+    np.savez_compressed(
+        out_path,
+        name=np.array(names),
+        region=np.array(regions),
+        latitude=np.array(latitudes, dtype=np.float64),
+        longitude=np.array(longitudes, dtype=np.float64),
+        population=np.array(populations, dtype=np.int64),
+    )
+    logger.info(f"Wrote {out_path}: {len(names)} places")
+
+
+class Gazetteer:
+    def __init__(self, path):
+        self.path = path
+        with np.load(path) as data:
+            order = np.argsort(data["latitude"], kind="stable")
+            self.name = data["name"][order]
+            self.region = data["region"][order]
+            self.latitude = data["latitude"][order]
+            self.longitude = data["longitude"][order]
+            self.population = data["population"][order]
+        self.xyz = unit_vectors(self.latitude, self.longitude)
+        logger.info(f"Loaded gazetteer {path}: {len(self.name)} places")
+
+    def __len__(self):
+        return len(self.name)
+
+    def _search(self, point, latitude, k):
+        band = INITIAL_BAND_DEG
+        while True:
+            lo = np.searchsorted(self.latitude, latitude - band, side="left")
+            hi = np.searchsorted(self.latitude, latitude + band, side="right")
+            if hi - lo >= k or band >= 180:
+                dots = self.xyz[lo:hi] @ point
+                top = np.argpartition(dots, len(dots) - k)[-k:] if len(dots) > k else np.arange(len(dots))
+                top = top[np.argsort(-dots[top])]
+                distances = chord_to_km(dots[top])
+                # Places outside the band are at least ``band`` degrees away
+                if band >= 180 or distances[-1] <= math.radians(band) * EARTH_RADIUS_KM:
+                    return lo + top, distances
+            band *= 2
+
+    def nearest_many(self, latitudes, longitudes, k=5):
+        """Return (indices, distances_km) arrays of shape (queries, k), nearest first.
+
+        Queries are grouped into rows of ``BATCH_ROW_DEG`` of latitude. All
+        queries of a row share one slice of places reaching the initial band
+        beyond the row on both sides, answered with a single
+        (queries, 3) @ (3, places) product and a row-wise ``argpartition``.
+        Lone queries, and queries whose k-th place lies farther than the
+        band, use the per-query widening search.
+        """
+        latitudes = np.asarray(latitudes, dtype=np.float64).reshape(-1)
+        points = unit_vectors(latitudes, longitudes).reshape(-1, 3)
+        k = min(k, len(self))
+        indices = np.empty((len(points), k), dtype=np.int64)
+        distances = np.empty((len(points), k), dtype=np.float64)
+        if not len(points) or not k:
+            return indices, distances
+        band = INITIAL_BAND_DEG
+        rows = np.floor(latitudes / BATCH_ROW_DEG)
+        order = np.argsort(rows, kind="stable")
+        for members in np.split(order, np.flatnonzero(np.diff(rows[order])) + 1):
+            row = rows[members[0]]
+            lo = np.searchsorted(self.latitude, row * BATCH_ROW_DEG - band, side="left")
+            hi = np.searchsorted(self.latitude, (row + 1) * BATCH_ROW_DEG + band, side="right")
+            if len(members) == 1 or hi - lo <= k:
+                misses = members
+            else:
+                dots = points[members] @ self.xyz[lo:hi].T
+                top = np.argpartition(-dots, k - 1, axis=1)[:, :k]
+                top_dots = np.take_along_axis(dots, top, axis=1)
+                ranked = np.argsort(-top_dots, axis=1)
+                indices[members] = lo + np.take_along_axis(top, ranked, axis=1)
+                distances[members] = chord_to_km(np.take_along_axis(top_dots, ranked, axis=1))
+                # Places outside the slice are at least ``band`` degrees from every query of the row
+                misses = members[distances[members, -1] > math.radians(band) * EARTH_RADIUS_KM]
+            for i in misses:
+                indices[i], distances[i] = self._search(points[i], latitudes[i], k)
+        return indices, distances
+
+    def nearest(self, latitude, longitude, k=5):
+        """Return the k nearest places to a point as dicts, nearest first.
+
+        ``azimuth`` is the direction from the place to the point, as in
+        "10 km NNE of <place>".
+        """
+        k = min(k, len(self))
+        if not k:
+            return []
+        indices, distances = self._search(unit_vectors(latitude, longitude), latitude, k)
+        return [self.place(i, distance, latitude, longitude) for i, distance in zip(indices, distances)]
+
+    def place(self, index, distance_km, latitude, longitude):
+        return {
+            "name": str(self.name[index]),
+            "region": str(self.region[index]),
+            "latitude": float(self.latitude[index]),
+            "longitude": float(self.longitude[index]),
+            "population": int(self.population[index]),
+            "distance_km": float(distance_km),
+            "azimuth": bearing(self.latitude[index], self.longitude[index], latitude, longitude),
+        }
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    if len(sys.argv) not in (4, 5) or sys.argv[1] != "build":
+        print("Usage: python gazetteer.py build <out.npz> <cities.txt> [admin1CodesASCII.txt]")
+        sys.exit(1)
+    build(sys.argv[2], sys.argv[3], sys.argv[4] if len(sys.argv) == 5 else None)
@@ -0,0 +1,321 @@
+"""
+Event History
+SQLite store of every earthquake seen in the feed, indexed for fast time,
+magnitude and location queries.
+
+Events live in the ``quakes`` table, with B-tree indexes on time and
+magnitude. Location and time are also kept in a 3-dimensional R-tree
+(longitude, latitude, day), so a radius/time-window query only visits the
+index nodes overlapping its bounding box; candidates are then checked
+exactly with the haversine distance.
+
+Months of the FDSN catalog can be bulk-loaded with:
+
+    python history.py backfill 2024-01-01 2024-07-01 [--min-magnitude 2.5] [--slice-days 7]
+
+The catalog is requested in time slices (FDSN caps one query at 20000
+events) and each response is parsed feature by feature as it streams in, so
+memory use does not grow with the size of the slice.
+"""
+
+import argparse
+import codecs
+import json
+import logging
+import math
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0
+DAY_MS = 86400 * 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS quakes (
+    id        INTEGER PRIMARY KEY,
+    event_id  TEXT NOT NULL UNIQUE,
+    time      INTEGER NOT NULL,
+    updated   INTEGER NOT NULL,
+    magnitude REAL,
+    latitude  REAL NOT NULL,
+    longitude REAL NOT NULL,
+    depth     REAL,
+    place     TEXT
+);
+CREATE INDEX IF NOT EXISTS quakes_time ON quakes (time);
+CREATE INDEX IF NOT EXISTS quakes_magnitude ON quakes (magnitude);
+CREATE VIRTUAL TABLE IF NOT EXISTS quakes_rtree USING rtree (
+    id, min_lon, max_lon, min_lat, max_lat, min_day, max_day
+);
+"""
+
+UPSERT = """
+INSERT INTO quakes (event_id, time, updated, magnitude, latitude, longitude, depth, place)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (event_id) DO UPDATE SET
+    time = excluded.time, updated = excluded.updated, magnitude = excluded.magnitude,
+    latitude = excluded.latitude, longitude = excluded.longitude,
+    depth = excluded.depth, place = excluded.place
+WHERE excluded.updated > quakes.updated
+"""
+
+# R-tree time axis is in days: its 32-bit float coordinates cannot hold millisecond timestamps
+UPSERT_RTREE = f"""
+INSERT OR REPLACE INTO quakes_rtree
+SELECT id, longitude, longitude, latitude, latitude, time / {DAY_MS}.0, time / {DAY_MS}.0
+FROM quakes WHERE event_id = ?
+"""
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_boxes(latitude, longitude, radius_km):
+    """Return (min_lon, max_lon, min_lat, max_lat) boxes covering a circle, split at the antimeridian."""
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = latitude - dlat, latitude + dlat
+    if min_lat <= -90 or max_lat >= 90:
+        # The circle covers a pole, so every longitude is in range
+        return [(-180.0, 180.0, max(min_lat, -90.0), min(max_lat, 90.0))]
+    dlon = math.degrees(radius_km / (EARTH_RADIUS_KM * math.cos(math.radians(max(abs(min_lat), abs(max_lat))))))
+    if dlon >= 180:
+        return [(-180.0, 180.0, min_lat, max_lat)]
+    min_lon, max_lon = longitude - dlon, longitude + dlon
+    if min_lon < -180:
+        return [(min_lon + 360, 180.0, min_lat, max_lat), (-180.0, max_lon, min_lat, max_lat)]
+    if max_lon > 180:
+        return [(min_lon, 180.0, min_lat, max_lat), (-180.0, max_lon - 360, min_lat, max_lat)]
+    return [(min_lon, max_lon, min_lat, max_lat)]
+
+
+def feature_row(feature):
+    props = feature["properties"]
+    longitude, latitude, depth = (feature["geometry"]["coordinates"] + [None])[:3]
+    return (
+        feature["id"],
+        props["time"],
+        props.get("updated") or props["time"],
+        props.get("mag"),
+        latitude,
+        longitude,
+        depth,
+        props.get("place"),
+    )
+
+
+def ordinal(n):
+    if 10 <= n % 100 <= 20:
+        suffix = "th"
+    else:
+        suffix = {1: "st", 2: "nd", 3: "rd"}.get(n % 10, "th")
+    return f"{n}{suffix}"
+
+
+class EventHistory:
+    """SQLite history of feed events; safe to share between threads."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def record(self, features):
+        """Insert or update feed features; returns the number of features given.
+
+        Features whose ``updated`` is not newer than the stored row are
+        skipped, so a poll of a long feed only writes the events that changed
+        (and their R-tree entries).
+        """
+        rows = [feature_row(f) for f in features if f.get("geometry")]
+        if not rows:
+            return 0
+        with self._lock:
+            stored = self._stored_updated([row[0] for row in rows])
+            changed = [row for row in rows if row[0] not in stored or row[2] > stored[row[0]]]
+            if changed:
+                self._conn.execute("BEGIN")
+                try:
+                    self._conn.executemany(UPSERT, changed)
+                    self._conn.executemany(UPSERT_RTREE, [(row[0],) for row in changed])
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+        return len(rows)
+
+    def _stored_updated(self, event_ids):
+        """Return {event_id: updated} for the given IDs already stored; call with ``_lock`` held."""
+        stored = {}
+        # Stay under SQLite's limit on bound parameters
+        for start in range(0, len(event_ids), 500):
+            chunk = event_ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            stored.update(self._conn.execute(
+                f"SELECT event_id, updated FROM quakes WHERE event_id IN ({placeholders})", chunk
+            ))
+        return stored
+
+    def nearby(self, latitude, longitude, radius_km, start_ms, end_ms, min_magnitude=None):
+        """Return events within ``radius_km`` of a point and between two times, oldest first."""
+        found = {}
+        with self._lock:
+            for min_lon, max_lon, min_lat, max_lat in bounding_boxes(latitude, longitude, radius_km):
+                rows = self._conn.execute(
+                    "SELECT q.event_id, q.time, q.magnitude, q.latitude, q.longitude, q.depth, q.place "
+                    "FROM quakes_rtree r JOIN quakes q ON q.id = r.id "
+                    "WHERE r.max_lon >= ? AND r.min_lon <= ? AND r.max_lat >= ? AND r.min_lat <= ? "
+                    "AND r.max_day >= ? AND r.min_day <= ? AND q.time BETWEEN ? AND ?",
+                    (min_lon, max_lon, min_lat, max_lat, start_ms / DAY_MS, end_ms / DAY_MS, start_ms, end_ms)
+                ).fetchall()
+                for row in rows:
+                    found[row[0]] = row
+        keys = ("event_id", "time", "magnitude", "latitude", "longitude", "depth", "place")
+        events = []
+        for row in found.values():
+            if min_magnitude is not None and (row[2] is None or row[2] < min_magnitude):
+                continue
+            distance = haversine_km(latitude, longitude, row[3], row[4])
+            if distance <= radius_km:
+                events.append(dict(zip(keys, row), distance_km=distance))
+        events.sort(key=lambda e: e["time"])
+        return events
+
+    def count_nearby(self, latitude, longitude, radius_km, start_ms, end_ms, min_magnitude=None):
+        return len(self.nearby(latitude, longitude, radius_km, start_ms, end_ms, min_magnitude))
+
+    def area_context(self, event, radius_km, days=7, min_magnitude=None):
+        """Return a "3rd quake within 100 km this week" line for a post, or None for the first one."""
+        count = self.count_nearby(
+            event.latitude, event.longitude, radius_km,
+            event.time - int(days * DAY_MS), event.time, min_magnitude
+        )
+        if count < 2:
+            return None
+        period = "this week" if days == 7 else f"in the last {days:g} days"
+        return f"{ordinal(count)} earthquake within {radius_km:g} km {period}"
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM quakes").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
+
+
+def iter_features(chunks):
+    """Yield features of a GeoJSON FeatureCollection from an iterable of byte chunks.
+
+    Only the ``features`` array is decoded, one feature at a time with
+    ``json.JSONDecoder.raw_decode``, so the whole payload is never held in
+    memory or parsed as one document.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    pos = 0
+    in_array = False
+    for chunk in chunks:
+        buffer = buffer[pos:] + utf8.decode(chunk)
+        pos = 0
+        if not in_array:
+            start = buffer.find('"features"')
+            bracket = buffer.find("[", start) if start >= 0 else -1
+            if bracket < 0:
+                # Keep the key, or a tail long enough to hold a split key, for the next chunk
+                pos = start if start >= 0 else max(0, len(buffer) - 16)
+                continue
+            in_array = True
+            pos = bracket + 1
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if buffer[pos] == "]":
+                return
+            try:
+                feature, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Incomplete feature, wait for the next chunk
+                break
+            yield feature
+            pos = end
+    if not in_array:
+        return
+    if buffer[pos:].strip():
+        raise ValueError("Truncated GeoJSON feature collection")
+
+
+def backfill(history, fdsn_url, start, end, min_magnitude=None, slice_days=7, timeout=60):
+    """Load the FDSN catalog between two datetimes into the history store."""
+    session = requests.Session()
+    total = 0
+    slice_start = start
+    while slice_start < end:
+        slice_end = min(slice_start + timedelta(days=slice_days), end)
+        params = {
+            "format": "geojson",
+            "orderby": "time-asc",
+            "starttime": slice_start.strftime("%Y-%m-%dT%H:%M:%S"),
+            "endtime": slice_end.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        if min_magnitude is not None:
+            params["minmagnitude"] = min_magnitude
+        started = time.monotonic()
+        count = 0
+        with session.get(fdsn_url, params=params, stream=True, timeout=timeout) as response:
+            if response.status_code != 204:
+                response.raise_for_status()
+                batch = []
+                for feature in iter_features(response.iter_content(chunk_size=65536)):
+                    batch.append(feature)
+                    if len(batch) >= 1000:
+                        count += history.record(batch)
+                        batch = []
+                count += history.record(batch)
+        total += count
+        logger.info(f"Loaded {count} events for {slice_start:%Y-%m-%d} - {slice_end:%Y-%m-%d} "
+                    f"in {time.monotonic() - started:.1f} s")
+        slice_start = slice_end
+    session.close()
+    return total
+
+
+def parse_date(value):
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+
+
+if __name__ == "__main__":
+    from config import HISTORY_DB_FILE, USGS_FDSN_URL, HTTP_TIMEOUT_SECONDS
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    parser = argparse.ArgumentParser(description="Earthquake history store")
+    commands = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = commands.add_parser("backfill", help="Bulk-load the FDSN catalog")
+    backfill_parser.add_argument("start", type=parse_date, help="Start date, e.g. 2024-01-01")
+    backfill_parser.add_argument("end", type=parse_date, help="End date (exclusive)")
+    backfill_parser.add_argument("--min-magnitude", type=float)
+    backfill_parser.add_argument("--slice-days", type=float, default=7)
+    backfill_parser.add_argument("--db", default=HISTORY_DB_FILE)
+    args = parser.parse_args()
+
+    store = EventHistory(args.db)
+    loaded = backfill(store, USGS_FDSN_URL, args.start, args.end, args.min_magnitude,
+                      args.slice_days, max(HTTP_TIMEOUT_SECONDS, 60))
+    logger.info(f"Backfill done: {loaded} events loaded, {len(store)} in store")
+    store.close()
@@ -0,0 +1,180 @@
+"""
+Event Ingestion
+Delivers batches of new events from a push stream and/or adaptive polling.
+
+The stream is a long-lived HTTP response carrying one JSON message per line,
+either as newline-delimited JSON or as Server-Sent Events (``data: {...}``).
+A message may be a GeoJSON Feature, a FeatureCollection, or a wrapper of the
+form ``{"action": ..., "data": <Feature>}``; features must follow the USGS
+GeoJSON layout. Any HTTP server producing that format, including a local
+stand-in, can be used as the source.
+
+Polling runs alongside the stream: while the stream is connected it is only a
+slow safety net, and while it is down the poll interval adapts to activity,
+dropping to the minimum when new events appear and backing off when quiet.
+"""
+
+import json
+import logging
+import queue
+import threading
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+def parse_stream_message(line):
+    """Return the features contained in one stream line, or an empty list."""
+    if isinstance(line, bytes):
+        line = line.decode("utf-8")
+    line = line.strip()
+    if line.startswith("data:"):
+        line = line[len("data:"):].strip()
+    if not line or line.startswith(":") or not line.startswith("{"):
+        return []
+    message = json.loads(line)
+    if "action" in message and "data" in message:
+        message = message["data"]
+    if message.get("type") == "FeatureCollection":
+        return message["features"]
+    if message.get("type") == "Feature":
+        return [message]
+    return []
+
+
+class AdaptivePoller:
+    """Poll interval that shrinks on activity and grows while the feed is quiet."""
+
+    def __init__(self, min_interval, max_interval, backoff=1.5):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.interval = max_interval
+
+    def update(self, found_events):
+        if found_events:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+        return self.interval
+
+
+class StreamSource:
+    """Reads features from a streaming HTTP endpoint, reconnecting with backoff."""
+
+    def __init__(self, url, read_timeout=120, max_reconnect_delay=60):
+        self.url = url
+        self.read_timeout = read_timeout
+        self.max_reconnect_delay = max_reconnect_delay
+        self.session = requests.Session()
+        self.connected = threading.Event()
+
+    def run(self, on_features, on_disconnect, stop):
+        delay = 1
+        while not stop.is_set():
+            try:
+                logger.info(f"Connecting to event stream {self.url}")
+                with self.session.get(self.url, stream=True, timeout=(10, self.read_timeout)) as response:
+                    response.raise_for_status()
+                    self.connected.set()
+                    delay = 1
+                    logger.info("Event stream connected")
+                    for line in response.iter_lines():
+                        if stop.is_set():
+                            return
+                        try:
+                            features = parse_stream_message(line)
+                        except ValueError as e:
+                            logger.warning(f"Skipping malformed stream message: {str(e)}")
+                            continue
+                        if features:
+                            on_features(features)
+                logger.warning("Event stream closed by server")
+            except Exception as e:
+                logger.error(f"Event stream error: {str(e)}")
+            self.connected.clear()
+            on_disconnect()
+            stop.wait(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+
+class Ingestor:
+    """Merges stream and polling sources into a single queue of event batches.
+
+    ``poll`` returns a list of new events; ``accept_features`` turns raw
+    stream features into a list of new events (deduplicated the same way as
+    polling). Both are called from background threads.
+    """
+
+    def __init__(self, poll, accept_features, poller, stream=None):
+        self.poll = poll
+        self.accept_features = accept_features
+        self.poller = poller
+        self.stream = stream
+        self._batches = queue.Queue()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._threads = []
+
+    def start(self):
+        self._threads.append(threading.Thread(target=self._poll_loop, name="ingest-poll", daemon=True))
+        if self.stream:
+            self._threads.append(threading.Thread(
+                target=self.stream.run,
+                args=(self._on_stream_features, self._on_stream_disconnect, self._stop),
+                name="ingest-stream",
+                daemon=True
+            ))
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def next_batch(self, timeout=5):
+        """Wait for the next batch of new events; returns an empty list on timeout."""
+        try:
+            return self._batches.get(timeout=timeout)
+        except queue.Empty:
+            return []
+
+    def batches(self):
+        while not self._stop.is_set():
+            events = self.next_batch()
+            if events:
+                yield events
+
+    def _on_stream_features(self, features):
+        try:
+            events = self.accept_features(features)
+        except Exception as e:
+            logger.error(f"Failed to handle stream features: {str(e)}")
+            return
+        if events:
+            logger.info(f"Received {len(events)} new event(s) from stream")
+            self._batches.put(events)
+
+    def _on_stream_disconnect(self):
+        # Poll fast right away until the stream is back
+        self.poller.interval = self.poller.min_interval
+        self._wake.set()
+
+    def _poll_loop(self):
+        while not self._stop.is_set():
+            try:
+                events = self.poll()
+            except Exception as e:
+                logger.error(f"Error fetching earthquake data: {str(e)}")
+                events = []
+            if events:
+                self._batches.put(events)
+            interval = self.poller.update(bool(events))
+            if self.stream and self.stream.connected.is_set():
+                # The stream delivers events; polling only catches anything it missed
+                interval = self.poller.max_interval
+            logger.debug(f"Next poll in {interval:.0f} s")
+            self._wake.clear()
+            self._wake.wait(interval)
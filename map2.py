@@ -1,8 +1,19 @@
 import logging
+import math
+import os
+import threading
+from functools import lru_cache
+from io import BytesIO
 from requests import get
-from time import sleep
 from PIL import Image, ImageDraw, ImageFont
 
+from config import (
+    YANDEX_MAPS_URL, MAP_CACHE_DIR, MAP_CACHE_MAX_MB, MAP_CACHE_GRID_PX,
+    HTTP_TIMEOUT_SECONDS, MAP_BACKEND, BASEMAP_FILE
+)
+from basemap import Basemap
+from map_cache import MapCache
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -10,6 +21,20 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+WATERMARK_FILE = os.path.join(BASE_DIR, "watermark15.png")
+FONT_FILE = os.path.join(BASE_DIR, "YandexSansDisplay-Regular.ttf")
+
+TILE_SIZE = 256
+MAP_WIDTH, MAP_HEIGHT = 600, 450
+MAX_ZOOM = 17
+MAX_LATITUDE = 85.05112878
+
+map_cache = MapCache(MAP_CACHE_DIR, MAP_CACHE_MAX_MB * 1024 * 1024)
+
+# FreeType faces are shared between render threads, so text drawing is serialized
+_font_lock = threading.Lock()
+
 def normalize_coordinates(long_lat):
     """Normalize and swap coordinates from latitude,longitude to longitude,latitude."""
     try:
@@ -30,65 +55,209 @@ def normalize_coordinates(long_lat):
         logger.error(f"Failed to normalize coordinates {long_lat}: {str(e)}")
         raise
 
-def make_a_map(long_lat, scale):
+def zoom_for_span(lat, scale):
+    """Pick the largest Web Mercator zoom at which a "lon,lat" span fits the map."""
+    span_lon, span_lat = map(float, scale.split(','))
+    degrees_per_pixel = 360 / TILE_SIZE
+    zoom_lon = math.log2(MAP_WIDTH * degrees_per_pixel / span_lon)
+    zoom_lat = math.log2(MAP_HEIGHT * degrees_per_pixel * math.cos(math.radians(lat)) / span_lat)
+    return max(0, min(MAX_ZOOM, int(math.floor(min(zoom_lon, zoom_lat)))))
+
+def lonlat_to_pixels(lon, lat, zoom):
+    """Project coordinates to global Web Mercator pixel coordinates at a zoom level."""
+    lat = max(min(lat, MAX_LATITUDE), -MAX_LATITUDE)
+    world = TILE_SIZE * 2 ** zoom
+    x = (lon + 180) / 360 * world
+    sin_lat = math.sin(math.radians(lat))
+    y = (0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * world
+    return x, y
+
+def pixels_to_lonlat(x, y, zoom):
+    world = TILE_SIZE * 2 ** zoom
+    lon = ((x / world * 360 - 180) + 180) % 360 - 180
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / world))))
+    return lon, lat
+
+def draw_epicenter(image, x, y, radius=7):
+    """Draw the epicenter marker at pixel position x, y."""
+    drawer = ImageDraw.Draw(image)
+    drawer.ellipse(
+        (x - radius, y - radius, x + radius, y + radius),
+        fill='#e4002b', outline='#ffffff', width=2
+    )
+
+def fetch_basemap(center, zoom):
+    """Return basemap image bytes for a "lon,lat" center, from the cache or Yandex Maps.
+
+    Returns None if Yandex rejects the request with 400, so the caller can
+    try another scale.
+    """
+    key = f"{center}|{zoom}|{MAP_WIDTH}x{MAP_HEIGHT}"
+    basemap = map_cache.get(key)
+    if basemap is not None:
+        logger.info(f"Map cache hit: ll={center}, z={zoom}")
+        return basemap
+    logger.info(f"Requesting map from Yandex Maps: ll={center}, z={zoom}")
+    url = (
+        f"{YANDEX_MAPS_URL}?ll={center}&lang=en-US&"
+        f"z={zoom}&size={MAP_WIDTH},{MAP_HEIGHT}&l=map"
+    )
+    logger.debug(f"Full Yandex Maps URL: {url}")
+    response = get(url, timeout=HTTP_TIMEOUT_SECONDS)
+    if response.status_code == 200:
+        if not response.headers['Content-Type'].startswith('image'):
+            raise Exception(f"Response is not an image: {response.text}")
+        logger.info("Map retrieved successfully")
+        map_cache.put(key, response.content)
+        return response.content
+    logger.warning(f"Yandex Maps API error: {response.status_code}, {response.text}")
+    if response.status_code == 400:
+        return None
+    raise Exception(f"Yandex Maps API error: {response.status_code}, {response.text}")
+
+def make_yandex_map(lon, lat, scale):
+    """Return a PNG map from Yandex basemaps with the epicenter marked, or None.
+
+    The basemap is requested for a center snapped to a MAP_CACHE_GRID_PX pixel
+    grid, so nearby events share one cached image; the epicenter marker is
+    then drawn locally at its exact position.
+    """
     try:
-        # Normalize coordinates
-        normalized_long_lat = normalize_coordinates(long_lat)
         scales = [scale, "5,5", "2,2", "1,1"]  # Try multiple scales
         for current_scale in scales:
-            logger.info(f"Requesting map from Yandex Maps: ll={normalized_long_lat}, spn={current_scale}")
-            url = (
-                f"https://static-maps.yandex.ru/1.x/?ll={normalized_long_lat}&lang=en-US&"
-                f"spn={current_scale}&l=map&pt={normalized_long_lat},round,5.5"
-            )
-            logger.debug(f"Full Yandex Maps URL: {url}")
-            response = get(url)
-            if response.status_code == 200:
-                if not response.headers['Content-Type'].startswith('image'):
-                    raise Exception(f"Response is not an image: {response.text}")
-                logger.info("Map retrieved successfully")
-                return response
-            else:
-                logger.warning(f"Yandex Maps API error: {response.status_code}, {response.text}")
-                if response.status_code == 400:
-                    logger.info(f"Retrying with smaller scale: {current_scale}")
-                    continue
-                raise Exception(f"Yandex Maps API error: {response.status_code}, {response.text}")
+            zoom = zoom_for_span(lat, current_scale)
+            x, y = lonlat_to_pixels(lon, lat, zoom)
+            grid_x = round(x / MAP_CACHE_GRID_PX) * MAP_CACHE_GRID_PX
+            grid_y = round(y / MAP_CACHE_GRID_PX) * MAP_CACHE_GRID_PX
+            center_lon, center_lat = pixels_to_lonlat(grid_x, grid_y, zoom)
+            basemap = fetch_basemap(f"{center_lon:.6f},{center_lat:.6f}", zoom)
+            if basemap is None:
+                logger.info(f"Retrying with smaller scale: {current_scale}")
+                continue
+            image = Image.open(BytesIO(basemap)).convert('RGBA')
+            draw_epicenter(image, image.width / 2 + x - grid_x, image.height / 2 + y - grid_y)
+            return encode_image(image, 'PNG')
         logger.error("Failed to fetch map after trying all scales")
-        return None  # Return None to allow script to continue without map
+        return None
+    except Exception as e:
+        logger.error(f"Failed to fetch map: {str(e)}")
+        return None
+
+@lru_cache(maxsize=1)
+def load_basemap():
+    """Memory-map the offline basemap dataset once per process, or return None if missing."""
+    if not os.path.exists(BASEMAP_FILE):
+        logger.warning(f"Offline basemap {BASEMAP_FILE} not found")
+        return None
+    return Basemap(BASEMAP_FILE)
+
+def make_offline_map(lon, lat, scale):
+    """Render a PNG map from the bundled coastline/border dataset, or None."""
+    try:
+        basemap = load_basemap()
+        if basemap is None:
+            return None
+        zoom = zoom_for_span(lat, scale)
+        world = TILE_SIZE * 2 ** zoom
+        x, y = lonlat_to_pixels(lon, lat, zoom)
+        left, top = x - MAP_WIDTH / 2, y - MAP_HEIGHT / 2
+        # Longitudes are left unwrapped so spans across the antimeridian stay contiguous
+        min_lon = left / world * 360 - 180
+        max_lon = (left + MAP_WIDTH) / world * 360 - 180
+        max_lat = pixels_to_lonlat(0, max(top, 0), zoom)[1]
+        min_lat = pixels_to_lonlat(0, min(top + MAP_HEIGHT, world), zoom)[1]
+
+        def project(point_lon, point_lat):
+            px, py = lonlat_to_pixels(point_lon, point_lat, zoom)
+            return px - left, py - top
+
+        logger.info(f"Rendering offline map: ll={lon},{lat}, z={zoom}")
+        image = basemap.render((min_lon, min_lat, max_lon, max_lat), project, (MAP_WIDTH, MAP_HEIGHT))
+        draw_epicenter(image, MAP_WIDTH / 2, MAP_HEIGHT / 2)
+        return encode_image(image, 'PNG')
+    except Exception as e:
+        logger.error(f"Failed to render offline map: {str(e)}")
+        return None
+
+def make_a_map(long_lat, scale):
+    """Return a PNG map around "lat,lon" coordinates with the epicenter marked, or None.
+
+    MAP_BACKEND selects Yandex static maps ("yandex"), the offline renderer
+    ("offline"), or Yandex with the offline renderer as fallback ("auto").
+    """
+    try:
+        # Normalize coordinates
+        normalized_long_lat = normalize_coordinates(long_lat)
+        lon, lat = map(float, normalized_long_lat.split(','))
     except Exception as e:
         logger.error(f"Failed to fetch map: {str(e)}")
         return None
+    if MAP_BACKEND != 'offline':
+        map_bytes = make_yandex_map(lon, lat, scale)
+        if map_bytes or MAP_BACKEND == 'yandex':
+            return map_bytes
+        logger.info("Falling back to offline basemap")
+    return make_offline_map(lon, lat, scale)
 
-def overlay_a_text(title):
+@lru_cache(maxsize=None)
+def load_font(size=24):
+    """Load the title font once per process."""
+    logger.info(f"Loading font {FONT_FILE} ({size}px)")
+    return ImageFont.truetype(FONT_FILE, size)
+
+@lru_cache(maxsize=4)
+def load_watermark(size):
+    """Decode the watermark once per process, resized to the map size if needed."""
+    logger.info(f"Loading watermark {WATERMARK_FILE} for size {size}")
+    watermark = Image.open(WATERMARK_FILE).convert('RGBA')
+    if watermark.size != size:
+        watermark = watermark.resize(size)
+    return watermark
+
+def encode_image(image, image_format='PNG', quality=85):
+    """Encode a rendered map into PNG, JPEG or WebP bytes."""
+    image_format = image_format.upper()
+    buffer = BytesIO()
+    if image_format == 'JPEG':
+        image.convert('RGB').save(buffer, format='JPEG', quality=quality, optimize=True)
+    elif image_format == 'WEBP':
+        image.save(buffer, format='WEBP', quality=quality)
+    else:
+        image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def overlay_a_text(map_bytes, title, image_format='PNG', quality=85):
+    """Draw the title and watermark over a map image and return the encoded bytes.
+
+    Everything happens in memory; the font and watermark are loaded on the
+    first call and reused afterwards.
+    """
     try:
         logger.info(f"Overlaying text on map: {title}")
-        image = Image.open("map.png").convert('RGBA')
-        imageWatermark = Image.open("watermark15.png").convert('RGBA')
-        font = ImageFont.truetype('YandexSansDisplay-Regular.ttf', 24)
+        image = Image.open(BytesIO(map_bytes)).convert('RGBA')
+        imageWatermark = load_watermark(image.size)
+        font = load_font(24)
         drawer = ImageDraw.Draw(image)
-        drawer.text((600/2, (450/2)-30), f"{title}", font=font, fill='#ffffff', stroke_width=8, stroke_fill='#010c80', anchor='mm')
+        with _font_lock:
+            drawer.text((600/2, (450/2)-30), f"{title}", font=font, fill='#ffffff', stroke_width=8, stroke_fill='#010c80', anchor='mm')
         my_img = Image.alpha_composite(image, imageWatermark)
-        my_img.save('new_map.png')
-        logger.info("Map with text and watermark saved as new_map.png")
-        return True
+        photo = encode_image(my_img, image_format, quality)
+        logger.info(f"Map with text and watermark rendered as {image_format.upper()} ({len(photo)} bytes)")
+        return photo
     except Exception as e:
         logger.error(f"Failed to process image: {str(e)}")
-        return False
+        return None
 
 def main():
     long_lat = '-117.8987,38.1577'
     title = '57 км к западу от Нанвалека, Аляска'
     scale = '15.5,15.5'
     try:
-        response = make_a_map(long_lat, scale)
-        if response:
-            with open("map.png", "wb") as file:
-                file.write(response.content)
-                logger.info("Map saved as map.png")
-            sleep(1)
-            if overlay_a_text(title):
-                image = Image.open("new_map.png")
+        map_bytes = make_a_map(long_lat, scale)
+        if map_bytes:
+            photo = overlay_a_text(map_bytes, title)
+            if photo:
+                image = Image.open(BytesIO(photo))
                 image.show()
                 logger.info("Map displayed successfully")
         else:
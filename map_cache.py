@@ -0,0 +1,85 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class MapCache:
+    """Disk-backed LRU cache of basemap images.
+
+    Each entry is one file named after the hash of its key. Recency is kept
+    in an in-memory ``OrderedDict`` (rebuilt from file modification times on
+    start-up) and least recently used files are deleted once the total size
+    exceeds ``max_bytes``.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._total = 0
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".img"):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            files.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._total += size
+        logger.info(f"Map cache {self.directory}: {len(self._entries)} entries, {self._total} bytes")
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    @staticmethod
+    def _name(key):
+        return hashlib.sha1(key.encode("utf-8")).hexdigest() + ".img"
+
+    def get(self, key):
+        name = self._name(key)
+        with self._lock:
+            if name not in self._entries:
+                return None
+            self._entries.move_to_end(name)
+        try:
+            with open(self._path(name), "rb") as f:
+                data = f.read()
+            # Keep modification time in step with recency for the next start-up scan
+            os.utime(self._path(name))
+            return data
+        except OSError:
+            with self._lock:
+                self._total -= self._entries.pop(name, 0)
+            return None
+
+    def put(self, key, data):
+        name = self._name(key)
+        tmp_path = f"{self._path(name)}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(name))
+        with self._lock:
+            self._total -= self._entries.pop(name, 0)
+            self._entries[name] = len(data)
+            self._total += len(data)
+            evicted = []
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                old_name, size = self._entries.popitem(last=False)
+                self._total -= size
+                evicted.append(old_name)
+        for old_name in evicted:
+            try:
+                os.remove(self._path(old_name))
+            except OSError as e:
+                logger.warning(f"Failed to remove cached map {old_name}: {str(e)}")
+        if evicted:
+            logger.info(f"Evicted {len(evicted)} cached map(s)")
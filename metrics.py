@@ -0,0 +1,165 @@
+"""
+Metrics
+Latency histograms and counters for the monitor, served in the Prometheus
+text format over HTTP.
+
+Each event carries its own stage timings (``event.timings``): the feed fetch
+and JSON parse of the poll that found it, enrichment, map fetch, render and
+Telegram send. They are added to the ``eq_stage_seconds`` histogram as they
+are measured. When the post is sent, ``eq_event_age_seconds`` records how
+long after the USGS ``time`` and ``updated`` timestamps it went out.
+
+    from metrics import start_server
+    start_server(9108)    # GET http://localhost:9108/metrics
+"""
+
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+AGE_BUCKETS = (10, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200)
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0}
+            series["counts"][bisect.bisect_left(self.buckets, value)] += 1
+            series["sum"] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: (list(s["counts"]), s["sum"]) for key, s in self._series.items()}
+        for key, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels(key + (('le', bound),))} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{format_labels(key)} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{format_labels(key)} {value}")
+        return lines
+
+
+stage_seconds = Histogram(
+    "eq_stage_seconds", "Time spent in each processing stage.", STAGE_BUCKETS
+)
+event_age_seconds = Histogram(
+    "eq_event_age_seconds", "Delay between the USGS event timestamp and the Telegram post.", AGE_BUCKETS
+)
+telegram_call_seconds = Histogram(
+    "eq_telegram_call_seconds", "Duration of Telegram Bot API requests.", STAGE_BUCKETS
+)
+stage_errors = Counter("eq_stage_errors_total", "Processing stages that raised an error.")
+events_posted = Counter("eq_events_posted_total", "Events posted or edited in Telegram.")
+
+REGISTRY = [stage_seconds, event_age_seconds, telegram_call_seconds, stage_errors, events_posted]
+
+# Callables receiving (stage, seconds, event) for every stage timing, e.g. to keep raw samples
+stage_listeners = []
+
+
+def observe_stage(stage, seconds, event=None):
+    stage_seconds.observe(seconds, stage=stage)
+    if event is not None:
+        event.timings[stage] = seconds
+    for listener in stage_listeners:
+        listener(stage, seconds, event)
+
+
+@contextmanager
+def span(event, stage):
+    """Time a block of work on an event as one stage."""
+    started = time.monotonic()
+    try:
+        yield
+    except Exception:
+        stage_errors.inc(stage=stage)
+        raise
+    finally:
+        observe_stage(stage, time.monotonic() - started, event)
+
+
+def observe_posted(event, now=None):
+    """Record the age of an event at the moment its post went out."""
+    now = time.time() if now is None else now
+    kind = "revision" if event.revision else "new"
+    event_age_seconds.observe(now - event.time / 1000, reference="time", kind=kind)
+    event_age_seconds.observe(now - event.updated / 1000, reference="updated", kind=kind)
+    events_posted.inc(kind=kind)
+    timings = " ".join(f"{stage}={seconds:.3f}s" for stage, seconds in event.timings.items())
+    logger.debug(f"Timings for {event.id}: {timings} age={now - event.time / 1000:.0f}s")
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+def start_server(port, host="0.0.0.0"):
+    """Serve /metrics from a background thread and return the server."""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
@@ -4,24 +4,36 @@
 """
 Monolith Script
 Handles web scraping, map generation, and Telegram posting for earthquake events.
+
+Selenium and Pillow (through map2) are imported on first use, so polling the
+feed does not load them and the browser stack is only needed when the
+scraping fallback actually runs.
 """
 
-from selenium import webdriver
-from selenium.webdriver.firefox.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
-from telebot import TeleBot
-import os
+import sys
+import atexit
 import logging
-from time import sleep
+import threading
+import time
 
 # Import configurations and map functions
 try:
     from config import (
-        TELEGRAM_TOKEN, TELEGRAM_CHANNEL_ID
+        TELEGRAM_TOKEN, TELEGRAM_CHANNEL_ID, SELENIUM_FALLBACK,
+        BROWSER_POOL_SIZE, BROWSER_MAX_PAGES, BROWSER_MAX_RSS_MB,
+        SCRAPE_MODE, SCRAPE_TIMEOUT_SECONDS, MAP_IMAGE_FORMAT,
+        MAP_IMAGE_QUALITY, TELEGRAM_API_URL, TELEGRAM_GLOBAL_RATE,
+        TELEGRAM_CHAT_RATE_PER_MINUTE, TELEGRAM_MAX_RETRIES,
+        TELEGRAM_BATCH_MODE, TELEGRAM_BATCH_WINDOW_SECONDS,
+        HTTP_TIMEOUT_SECONDS, POSTS_DB_FILE, POST_TRACKING_DAYS,
+        HISTORY_DB_FILE, HISTORY_RADIUS_KM, HISTORY_DAYS
     )
-    from map2 import make_a_map, overlay_a_text
+    from event_details import fetch_event_details, fetch_detail
+    from event import Event
+    from telegram_sender import TelegramSender
+    from post_registry import PostRegistry
+    from history import EventHistory
+    import metrics
     logger = logging.getLogger(__name__)
     logger.info("Imported configurations and map functions")
 except ImportError as e:
@@ -35,213 +47,390 @@ logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 )
 
-# Define file paths
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-COORDINATES_FILE = os.path.join(BASE_DIR, "coordinates.txt")
-LAST_EVENT_FILE = os.path.join(BASE_DIR, "last_event.txt")
-LAST_MAGNITUDE_FILE = os.path.join(BASE_DIR, "last_magnitude.txt")
-MAP_FILE = os.path.join(BASE_DIR, "map.png")
-NEW_MAP_FILE = os.path.join(BASE_DIR, "new_map.png")
+_browser_pool = None
+_browser_pool_lock = threading.Lock()
 
-class ParseMode:
-    """Telegram Message Parse Modes."""
-    HTML = 'HTML'
+def get_browser_pool():
+    """Return the process-wide browser pool, creating it on first use."""
+    global _browser_pool
+    with _browser_pool_lock:
+        if _browser_pool is None:
+            from browser_pool import BrowserPool
+            _browser_pool = BrowserPool(
+                size=BROWSER_POOL_SIZE,
+                max_pages=BROWSER_MAX_PAGES,
+                max_rss_mb=BROWSER_MAX_RSS_MB
+            )
+            atexit.register(_browser_pool.close)
+        return _browser_pool
+
+# Reads the event header and nearby places in a single WebDriver round trip.
+# Returns null until the header has rendered; "complete" turns true once the
+# nearby place list is populated too.
+EXTRACT_REGION_INFO_JS = """
+const header = document.querySelector('event-page-header header');
+if (!header || !header.querySelector('h1')) {
+    return null;
+}
+const html = (el) => el ? el.innerHTML : null;
+const items = header.querySelectorAll('ul > li');
+// Time, coordinates and depth are the first three items; wait until all are there
+if (items.length < 3) {
+    return null;
+}
+const places = document.querySelectorAll(
+    'geoserve-nearby-place-list ol > li > geoserve-nearby-place'
+);
+const nearby = Array.from(places).slice(0, 5).map((place) => {
+    const asides = place.querySelectorAll('aside');
+    return {
+        city: html(place.querySelector('span')),
+        distance: html(asides[0]),
+        population: html(asides[1])
+    };
+});
+return {
+    title: html(header.querySelector('h1')),
+    time: html(items[0]),
+    coordinates: html(items[1]),
+    depth: html(items[2]),
+    nearby: nearby.filter((p) => p.city && p.distance && p.population),
+    complete: nearby.length > 0
+};
+"""
+
+def scrape_region_info(driver, url):
+    """Scrape event details from the USGS region-info page with Selenium."""
+    if SCRAPE_MODE == 'xpath':
+        return scrape_region_info_xpath(driver, url)
+    return scrape_region_info_script(driver, url)
+
+def scrape_region_info_script(driver, url):
+    """Wait for the page to render, then extract all fields with one execute_script call."""
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.common.exceptions import TimeoutException
+
+    logger.info(f"Navigating to {url}")
+    driver.get(url)
+
+    logger.info("Scraping earthquake data")
+    last_result = {}
+
+    def extract(driver):
+        result = driver.execute_script(EXTRACT_REGION_INFO_JS)
+        if result:
+            last_result.update(result)
+        return result if result and result['complete'] else False
 
-def main():
-    logger.info("Starting monolith script")
-    """Main function to scrape data, generate map, and post to Telegram."""
-    driver = None
     try:
-        # Read event URL
-        logger.info(f"Reading event URL from {LAST_EVENT_FILE}")
-        with open(LAST_EVENT_FILE, 'r') as f:
-            url = f.read().strip() + '/region-info'
-
-        # Set up Firefox driver
-        logger.info("Starting Firefox driver")
-        options = Options()
-        options.add_argument("--no-sandbox")
-        options.add_argument("--headless")
-        options.add_argument("--disable-dev-shm-usage")
-        driver = webdriver.Firefox(options=options)
-        logger.info(f"Navigating to {url}")
-        driver.get(url)
-
-        # Define XPaths
-        mag_n_loc = '/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/event-page-header/header/h1'
-        time_of_event = "/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/event-page-header/header/ul/li[1]"
-        long_lat_path = "/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/event-page-header/header/ul/li[2]"
-        depth = "/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/event-page-header/header/ul/li[3]"
-        nearby_places = [
-            {
-                'name': '/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/app-region-info/region-info-display/geoserve-nearby-place-list/div/ol/li[1]/geoserve-nearby-place/span',
-                'distance': '/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/app-region-info/region-info-display/geoserve-nearby-place-list/div/ol/li[1]/geoserve-nearby-place/aside[1]',
-                'population': '/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/app-region-info/region-info-display/geoserve-nearby-place-list/div/ol/li[1]/geoserve-nearby-place/aside[2]'
-            },
-            {
-                'name': '/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/app-region-info/region-info-display/geoserve-nearby-place-list/div/ol/li[2]/geoserve-nearby-place/span',
-                'distance': '/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/app-region-info/region-info-display/geoserve-nearby-place-list/div/ol/li[2]/geoserve-nearby-place/aside[1]',
-                'population': '/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/app-region-info/region-info-display/geoserve-nearby-place-list/div/ol/li[2]/geoserve-nearby-place/aside[2]'
-            },
-            {
-                'name': '/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/app-region-info/region-info-display/geoserve-nearby-place-list/div/ol/li[3]/geoserve-nearby-place/span',
-                'distance': '/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/app-region-info/region-info-display/geoserve-nearby-place-list/div/ol/li[3]/geoserve-nearby-place/aside[1]',
-                'population': '/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/app-region-info/region-info-display/geoserve-nearby-place-list/div/ol/li[3]/geoserve-nearby-place/aside[2]'
-            },
-            {
-                'name': '/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/app-region-info/region-info-display/geoserve-nearby-place-list/div/ol/li[4]/geoserve-nearby-place/span',
-                'distance': '/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/app-region-info/region-info-display/geoserve-nearby-place-list/div/ol/li[4]/geoserve-nearby-place/aside[1]',
-                'population': '/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/app-region-info/region-info-display/geoserve-nearby-place-list/div/ol/li[4]/geoserve-nearby-place/aside[2]'
-            },
-            {
-                'name': '/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/app-region-info/region-info-display/geoserve-nearby-place-list/div/ol/li[5]/geoserve-nearby-place/span',
-                'distance': '/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/app-region-info/region-info-display/geoserve-nearby-place-list/div/ol/li[5]/geoserve-nearby-place/aside[1]',
-                'population': '/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/app-region-info/region-info-display/geoserve-nearby-place-list/div/ol/li[5]/geoserve-nearby-place/aside[2]'
-            }
-        ]
-
-        # Scrape data
-        logger.info("Scraping earthquake data")
-        magnitude_and_location = WebDriverWait(driver, 20).until(
-            EC.visibility_of_element_located((By.XPATH, mag_n_loc))
-        ).get_attribute('innerHTML')
-        time_of_event_data = WebDriverWait(driver, 20).until(
-            EC.visibility_of_element_located((By.XPATH, time_of_event))
-        ).get_attribute('innerHTML')
-        long_lat = WebDriverWait(driver, 20).until(
-            EC.visibility_of_element_located((By.XPATH, long_lat_path))
-        ).get_attribute('innerHTML')
-        depth_data = WebDriverWait(driver, 20).until(
-            EC.visibility_of_element_located((By.XPATH, depth))
-        ).get_attribute('innerHTML')
-
-        nearby_data = []
-        for place in nearby_places:
-            try:
-                city = WebDriverWait(driver, 20).until(
-                    EC.visibility_of_element_located((By.XPATH, place['name']))
-                ).get_attribute('innerHTML')
-                distance = WebDriverWait(driver, 20).until(
-                    EC.visibility_of_element_located((By.XPATH, place['distance']))
-                ).get_attribute('innerHTML')
-                population = WebDriverWait(driver, 20).until(
-                    EC.visibility_of_element_located((By.XPATH, place['population']))
-                ).get_attribute('innerHTML')
-                nearby_data.append({
-                    'city': city,
-                    'distance': distance,
-                    'population': population
-                })
-            except Exception as e:
-                logger.warning(f"Failed to scrape nearby place: {e}")
-                continue
-
-        # Read coordinates
-        logger.info(f"Reading coordinates from {COORDINATES_FILE}")
-        with open(COORDINATES_FILE, 'r') as f:
-            long_lat = f.read().strip()
-        logger.info(f"Coordinates read: {long_lat}")
-
-        # Remove old map files
-        logger.info("Removing old map files if they exist")
-        for map_file in [MAP_FILE, NEW_MAP_FILE]:
-            if os.path.exists(map_file):
-                try:
-                    os.remove(map_file)
-                    logger.info(f"Removed {map_file}")
-                except Exception as e:
-                    logger.warning(f"Failed to remove {map_file}: {str(e)}")
-
-        # Generate map
-        logger.info("Generating map")
-        response = make_a_map(long_lat, '10,10')
-        map_generated = False
-        if response:
-            with open(MAP_FILE, 'wb') as file:
-                file.write(response.content)
-            logger.info(f"Map saved as {MAP_FILE}")
-            sleep(5)
-            if overlay_a_text(magnitude_and_location):
-                if os.path.exists(NEW_MAP_FILE):
-                    map_generated = True
-                else:
-                    logger.warning(f"Map file {NEW_MAP_FILE} was not created")
-            else:
-                logger.warning("Failed to overlay text on map")
-        else:
-            logger.warning("Map generation failed, proceeding without map")
-
-        # Initialize Telegram bot
-        logger.info("Initializing Telegram bot")
-        bot = TeleBot(token=TELEGRAM_TOKEN)
-
-        # Read magnitude
-        logger.info(f"Reading magnitude from {LAST_MAGNITUDE_FILE}")
-        with open(LAST_MAGNITUDE_FILE, 'r') as f:
-            magnitude = float(f.read().strip())
-
-        # Prepare message
-        nearby_text = ""
-        for data in nearby_data:
-            city = data['city'].replace("('","").replace("',)","")
-            distance = data['distance'].replace("('","").replace("',)","")
-            population = data['population'].replace("Population:", "").strip()
-            nearby_text += (
-                f"<u>Name:</u> <b>{city}</b> \n"
-                f"<u>Distance from epicenter:</u> <b>{distance}</b> \n"
-                f"<u>Population:</u> <b>{population}</b>\n\n"
-            )
+        result = WebDriverWait(driver, SCRAPE_TIMEOUT_SECONDS, poll_frequency=0.25).until(extract)
+    except TimeoutException:
+        if not all(last_result.get(field) for field in ('title', 'time', 'depth')):
+            raise
+        # The header rendered but the nearby place list did not, post without it
+        logger.warning("Nearby places did not render before the deadline")
+        result = last_result
 
-        prefix = ""
-        if magnitude <= 3.5:
-            prefix = ""
-        elif magnitude < 5:
-            prefix = "<b>! </b>"
-        else:
-            prefix = "<b>!!! </b>"
-
-        msg = (
-            f"{prefix}<b>{magnitude_and_location}</b> \n"
-            f"<b>Time: </b> {time_of_event_data} \n"
-            f"<b>Depth</b>: {depth_data.replace('depth', '')} \n\n"
-            f"<i><b>Nearby settlements: </b></i> \n"
-            f"{nearby_text}"
-            f"*source: USGS."
+    return {
+        'title': result['title'],
+        'time': result['time'],
+        'coordinates': result['coordinates'],
+        'depth': result['depth'],
+        'nearby': result['nearby']
+    }
+
+def scrape_region_info_xpath(driver, url):
+    """Scrape event details field by field with one WebDriverWait per XPath."""
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+
+    logger.info(f"Navigating to {url}")
+    driver.get(url)
+
+    # Define XPaths
+    mag_n_loc = '/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/event-page-header/header/h1'
+    time_of_event = "/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/event-page-header/header/ul/li[1]"
+    long_lat_path = "/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/event-page-header/header/ul/li[2]"
+    depth = "/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/event-page-header/header/ul/li[3]"
+    nearby_places = [
+        {
+            'name': '/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/app-region-info/region-info-display/geoserve-nearby-place-list/div/ol/li[1]/geoserve-nearby-place/span',
+            'distance': '/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/app-region-info/region-info-display/geoserve-nearby-place-list/div/ol/li[1]/geoserve-nearby-place/aside[1]',
+            'population': '/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/app-region-info/region-info-display/geoserve-nearby-place-list/div/ol/li[1]/geoserve-nearby-place/aside[2]'
+        },
+        {
+            'name': '/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/app-region-info/region-info-display/geoserve-nearby-place-list/div/ol/li[2]/geoserve-nearby-place/span',
+            'distance': '/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/app-region-info/region-info-display/geoserve-nearby-place-list/div/ol/li[2]/geoserve-nearby-place/aside[1]',
+            'population': '/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/app-region-info/region-info-display/geoserve-nearby-place-list/div/ol/li[2]/geoserve-nearby-place/aside[2]'
+        },
+        {
+            'name': '/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/app-region-info/region-info-display/geoserve-nearby-place-list/div/ol/li[3]/geoserve-nearby-place/span',
+            'distance': '/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/app-region-info/region-info-display/geoserve-nearby-place-list/div/ol/li[3]/geoserve-nearby-place/aside[1]',
+            'population': '/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/app-region-info/region-info-display/geoserve-nearby-place-list/div/ol/li[3]/geoserve-nearby-place/aside[2]'
+        },
+        {
+            'name': '/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/app-region-info/region-info-display/geoserve-nearby-place-list/div/ol/li[4]/geoserve-nearby-place/span',
+            'distance': '/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/app-region-info/region-info-display/geoserve-nearby-place-list/div/ol/li[4]/geoserve-nearby-place/aside[1]',
+            'population': '/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/app-region-info/region-info-display/geoserve-nearby-place-list/div/ol/li[4]/geoserve-nearby-place/aside[2]'
+        },
+        {
+            'name': '/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/app-region-info/region-info-display/geoserve-nearby-place-list/div/ol/li[5]/geoserve-nearby-place/span',
+            'distance': '/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/app-region-info/region-info-display/geoserve-nearby-place-list/div/ol/li[5]/geoserve-nearby-place/aside[1]',
+            'population': '/html/body/app-root/app-event-page/hazdev-template/div/div/div[2]/main/app-region-info/region-info-display/geoserve-nearby-place-list/div/ol/li[5]/geoserve-nearby-place/aside[2]'
+        }
+    ]
+
+    # Scrape data
+    logger.info("Scraping earthquake data")
+    magnitude_and_location = WebDriverWait(driver, 20).until(
+        EC.visibility_of_element_located((By.XPATH, mag_n_loc))
+    ).get_attribute('innerHTML')
+    time_of_event_data = WebDriverWait(driver, 20).until(
+        EC.visibility_of_element_located((By.XPATH, time_of_event))
+    ).get_attribute('innerHTML')
+    long_lat = WebDriverWait(driver, 20).until(
+        EC.visibility_of_element_located((By.XPATH, long_lat_path))
+    ).get_attribute('innerHTML')
+    depth_data = WebDriverWait(driver, 20).until(
+        EC.visibility_of_element_located((By.XPATH, depth))
+    ).get_attribute('innerHTML')
+
+    nearby_data = []
+    for place in nearby_places:
+        try:
+            city = WebDriverWait(driver, 20).until(
+                EC.visibility_of_element_located((By.XPATH, place['name']))
+            ).get_attribute('innerHTML')
+            distance = WebDriverWait(driver, 20).until(
+                EC.visibility_of_element_located((By.XPATH, place['distance']))
+            ).get_attribute('innerHTML')
+            population = WebDriverWait(driver, 20).until(
+                EC.visibility_of_element_located((By.XPATH, place['population']))
+            ).get_attribute('innerHTML')
+            nearby_data.append({
+                'city': city,
+                'distance': distance,
+                'population': population
+            })
+        except Exception as e:
+            logger.warning(f"Failed to scrape nearby place: {e}")
+            continue
+
+    return {
+        'title': magnitude_and_location,
+        'time': time_of_event_data,
+        'coordinates': long_lat,
+        'depth': depth_data,
+        'nearby': nearby_data
+    }
+
+def get_event_details(event_url):
+    """Fetch event details over HTTP, falling back to Selenium scraping if enabled."""
+    try:
+        return fetch_event_details(event_url)
+    except Exception as e:
+        logger.warning(f"Failed to fetch event details over HTTP: {str(e)}")
+        if not SELENIUM_FALLBACK:
+            raise
+    logger.info("Falling back to scraping the region-info page")
+    with get_browser_pool().driver() as driver:
+        return scrape_region_info(driver, event_url + '/region-info')
+
+def fetch_map(long_lat):
+    """Fetch the basemap for "lat,lon" coordinates and return the image bytes, or None."""
+    from map2 import make_a_map
+
+    logger.info("Generating map")
+    map_bytes = make_a_map(long_lat, '10,10')
+    if not map_bytes:
+        logger.warning("Map generation failed, proceeding without map")
+    return map_bytes
+
+def render_photo(map_bytes, title):
+    """Overlay the title and watermark on a map and return the photo bytes, or None."""
+    from map2 import overlay_a_text
+
+    photo = overlay_a_text(map_bytes, title, MAP_IMAGE_FORMAT, MAP_IMAGE_QUALITY)
+    if not photo:
+        logger.warning("Failed to overlay text on map")
+    return photo
+
+def build_message(details, magnitude, context=None):
+    """Format the Telegram post for an event, with an optional line of regional context."""
+    nearby_text = ""
+    for data in details['nearby']:
+        city = data['city'].replace("('","").replace("',)","")
+        distance = data['distance'].replace("('","").replace("',)","")
+        population = data['population'].replace("Population:", "").strip()
+        nearby_text += (
+            f"<u>Name:</u> <b>{city}</b> \n"
+            f"<u>Distance from epicenter:</u> <b>{distance}</b> \n"
+            f"<u>Population:</u> <b>{population}</b>\n\n"
         )
 
-        # Send to Telegram
-        logger.info(f"Sending message to Telegram channel {TELEGRAM_CHANNEL_ID}")
-        if 'undefined' not in magnitude_and_location:
-            if map_generated and os.path.exists(NEW_MAP_FILE):
-                with open(NEW_MAP_FILE, 'rb') as photo:
-                    bot.send_photo(
-                        chat_id=TELEGRAM_CHANNEL_ID,
-                        photo=photo,
-                        caption=msg,
-                        parse_mode=ParseMode.HTML
-                    )
-                logger.info("Message with photo sent successfully")
-            else:
-                bot.send_message(
-                    chat_id=TELEGRAM_CHANNEL_ID,
-                    text=msg + "\n<i>Map unavailable due to API error.</i>",
-                    parse_mode=ParseMode.HTML
-                )
-                logger.info("Message sent without photo due to map generation failure")
-        else:
-            logger.warning("Skipping Telegram message due to invalid magnitude_and_location")
+    context_text = f"<i>{context}.</i>\n" if context else ""
+
+    prefix = ""
+    if magnitude <= 3.5:
+        prefix = ""
+    elif magnitude < 5:
+        prefix = "<b>! </b>"
+    else:
+        prefix = "<b>!!! </b>"
+
+    return (
+        f"{prefix}<b>{details['title']}</b> \n"
+        f"<b>Time: </b> {details['time']} \n"
+        f"<b>Depth</b>: {details['depth'].replace('depth', '')} \n\n"
+        f"<i><b>Nearby settlements: </b></i> \n"
+        f"{nearby_text}"
+        f"{context_text}"
+        f"*source: USGS."
+    )
+
+_sender = None
+_sender_lock = threading.Lock()
+
+def get_sender():
+    """Return the process-wide Telegram sender, creating it on first use."""
+    global _sender
+    with _sender_lock:
+        if _sender is None:
+            _sender = TelegramSender(
+                TELEGRAM_TOKEN,
+                api_url=TELEGRAM_API_URL,
+                global_rate=TELEGRAM_GLOBAL_RATE,
+                chat_rate_per_minute=TELEGRAM_CHAT_RATE_PER_MINUTE,
+                max_retries=TELEGRAM_MAX_RETRIES,
+                timeout=HTTP_TIMEOUT_SECONDS,
+                batch_mode=TELEGRAM_BATCH_MODE,
+                batch_window=TELEGRAM_BATCH_WINDOW_SECONDS
+            )
+            atexit.register(_sender.flush, 60)
+        return _sender
+
+_post_registry = None
+_post_registry_lock = threading.Lock()
+
+def get_post_registry():
+    """Return the process-wide registry of posted messages, opening it on first use."""
+    global _post_registry
+    with _post_registry_lock:
+        if _post_registry is None:
+            _post_registry = PostRegistry(POSTS_DB_FILE, POST_TRACKING_DAYS)
+        return _post_registry
+
+_history = None
+_history_lock = threading.Lock()
+
+def get_history():
+    """Return the process-wide event history store, opening it on first use."""
+    global _history
+    with _history_lock:
+        if _history is None:
+            _history = EventHistory(HISTORY_DB_FILE)
+        return _history
+
+def area_context(event):
+    """Describe how active the event's area has been recently, or None."""
+    try:
+        return get_history().area_context(event, HISTORY_RADIUS_KM, HISTORY_DAYS)
+    except Exception as e:
+        logger.warning(f"Failed to query event history: {str(e)}")
+        return None
+
+def publish(title, msg, photo=None, chat_ids=None):
+    """Queue the post for the Telegram channels, with the map photo if there is one.
+
+    Returns {chat_id: Post}; each post's future resolves to the sent Telegram message.
+    """
+    if 'undefined' in title:
+        logger.warning("Skipping Telegram message due to invalid magnitude_and_location")
+        return {}
+
+    chat_ids = chat_ids or [TELEGRAM_CHANNEL_ID]
+    if not photo:
+        logger.info("Posting without photo due to map generation failure")
+        msg += "\n<i>Map unavailable due to API error.</i>"
+    logger.info(f"Queueing message for Telegram channel(s) {', '.join(map(str, chat_ids))}")
+    return get_sender().publish(chat_ids, msg, photo)
+
+def track_sends(event, posts):
+    """Record send time and event age for each post once Telegram accepts it."""
+    queued = time.monotonic()
+
+    def sent(future):
+        if future.exception() is None:
+            metrics.observe_stage('send', time.monotonic() - queued, event)
+            metrics.observe_posted(event)
+
+    for post in posts.values():
+        post.future.add_done_callback(sent)
+
+def track_posts(event, posts):
+    """Remember which messages an event was posted in, so revisions can edit them."""
+    if not posts:
+        return
+    registry = get_post_registry()
+    registry.record_event(event)
+
+    def record(chat_id, post, future):
+        if future.exception() is None:
+            registry.record_message(event.id, chat_id, future.result()['message_id'], post.kind)
+
+    for chat_id, post in posts.items():
+        post.future.add_done_callback(lambda f, chat_id=chat_id, post=post: record(chat_id, post, f))
+
+def update_posts(event, msg, photo=None):
+    """Edit the messages an event was posted in with its revised text and map."""
+    messages = get_post_registry().messages(event.id)
+    if not messages:
+        logger.warning(f"No posted messages recorded for revised event {event.id}")
+    for message in messages:
+        logger.info(f"Editing message {message['message_id']} in {message['chat_id']} for {event.id}")
+        try:
+            get_sender().edit(message['chat_id'], message['message_id'], message['kind'], msg, photo)
+        except Exception as e:
+            logger.error(f"Failed to edit message {message['message_id']} in {message['chat_id']}: {str(e)}")
+
+def deliver(event):
+    """Post a new event, or edit the earlier posts of a revised one."""
+    msg = build_message(event.details, event.magnitude, area_context(event))
+    if event.revision:
+        with metrics.span(event, 'send'):
+            update_posts(event, msg, event.photo)
+        metrics.observe_posted(event)
+    else:
+        posts = publish(event.details['title'], msg, event.photo, event.chat_ids)
+        track_sends(event, posts)
+        track_posts(event, posts)
+
+def process_event(event):
+    """Fetch details and map for one event and post it, one step after another."""
+    with metrics.span(event, 'enrich'):
+        event.details = get_event_details(event.url)
+    with metrics.span(event, 'map'):
+        event.map_bytes = fetch_map(event.long_lat)
+    if event.map_bytes:
+        with metrics.span(event, 'render'):
+            event.photo = render_photo(event.map_bytes, event.details['title'])
+    deliver(event)
+
+def main(event):
+    logger.info("Starting monolith script")
+    """Main function to fetch event details, generate map, and post to Telegram."""
+    try:
+        logger.info(f"Processing event {event.id} ({event.url})")
+        process_event(event)
 
     except Exception as e:
         logger.error(f"Critical error: {str(e)}")
         raise
-    
-    finally:
-        if driver:
-            logger.info("Closing driver")
-            driver.close()
-            driver.quit()
 
 if __name__ == "__main__":
+    # Usage: python monolith.py <usgs_event_id>
     logger.info("Starting monolith script")
-    main()
-    logger.info("Monolith script completed")
\ No newline at end of file
+    main(Event.from_feature(fetch_detail(sys.argv[1])))
+    get_sender().flush()
+    logger.info("Monolith script completed")
@@ -0,0 +1,119 @@
+"""
+Event Pipeline
+Processes earthquakes through explicit asyncio stages connected by bounded
+queues, so several events of a swarm are handled at the same time:
+
+    poll -> enrich --+
+         -> map -----+-> render -> publish
+
+The map for an event is fetched while its details are still being enriched.
+Every stage works on the same in-memory ``event.Event`` object; map images
+stay in memory as bytes from download to upload. Each stage runs a fixed
+number of workers, and a full queue makes the stage in front of it wait,
+which keeps memory bounded during large swarms.
+Blocking work runs in worker threads via ``asyncio.to_thread``.
+"""
+
+import asyncio
+import logging
+
+import metrics
+import monolith
+
+logger = logging.getLogger(__name__)
+
+
+class Pipeline:
+    def __init__(self, collect_events, poll_interval, queue_size=20, enrich_workers=4,
+                 map_workers=4, render_workers=1, publish_workers=1):
+        self.collect_events = collect_events
+        self.poll_interval = poll_interval
+        self.workers = {
+            "enrich": enrich_workers,
+            "map": map_workers,
+            "render": render_workers,
+            "publish": publish_workers,
+        }
+        self.enrich_queue = asyncio.Queue(maxsize=queue_size)
+        self.map_queue = asyncio.Queue(maxsize=queue_size)
+        self.render_queue = asyncio.Queue(maxsize=queue_size)
+        self.publish_queue = asyncio.Queue(maxsize=queue_size)
+        # id(event) -> number of stages (enrichment, map fetch) still running;
+        # keyed by object so a revision can overlap the original event
+        self._pending = {}
+
+    async def run(self):
+        stages = {
+            "enrich": (self.enrich_queue, self._enrich),
+            "map": (self.map_queue, self._fetch_map),
+            "render": (self.render_queue, self._render),
+            "publish": (self.publish_queue, self._publish),
+        }
+        tasks = [asyncio.create_task(self._poll(), name="poll")]
+        for stage, (queue, handler) in stages.items():
+            for i in range(self.workers[stage]):
+                tasks.append(asyncio.create_task(self._worker(stage, queue, handler), name=f"{stage}-{i}"))
+        logger.info(f"Pipeline started with workers {self.workers}")
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _poll(self):
+        while True:
+            try:
+                events = await asyncio.to_thread(self.collect_events)
+            except Exception as e:
+                logger.error(f"Error fetching earthquake data: {str(e)}")
+                events = []
+            for event in events:
+                logger.info(f"Queueing {'revised' if event.revision else 'new'} earthquake: {event.place} (M{event.magnitude})")
+                # Enrichment and map fetch both have to finish before rendering
+                self._pending[id(event)] = 2
+                await self.enrich_queue.put(event)
+                await self.map_queue.put(event)
+            await asyncio.sleep(self.poll_interval)
+
+    async def _worker(self, stage, queue, handler):
+        while True:
+            event = await queue.get()
+            try:
+                await handler(event)
+            except Exception as e:
+                logger.error(f"Stage {stage} failed for {event.url}: {str(e)}")
+            finally:
+                queue.task_done()
+
+    async def _stage_done(self, event):
+        self._pending[id(event)] -= 1
+        if self._pending[id(event)] == 0:
+            del self._pending[id(event)]
+            await self.render_queue.put(event)
+
+    async def _enrich(self, event):
+        try:
+            with metrics.span(event, "enrich"):
+                event.details = await asyncio.to_thread(monolith.get_event_details, event.url)
+        finally:
+            await self._stage_done(event)
+
+    async def _fetch_map(self, event):
+        try:
+            with metrics.span(event, "map"):
+                event.map_bytes = await asyncio.to_thread(monolith.fetch_map, event.long_lat)
+        finally:
+            await self._stage_done(event)
+
+    async def _render(self, event):
+        if event.details is None:
+            logger.warning(f"Dropping {event.url}: event details unavailable")
+            return
+        if event.map_bytes:
+            with metrics.span(event, "render"):
+                event.photo = await asyncio.to_thread(monolith.render_photo, event.map_bytes, event.details["title"])
+        await self.publish_queue.put(event)
+
+    async def _publish(self, event):
+        await asyncio.to_thread(monolith.deliver, event)
+        logger.info(f"{'Updated' if event.revision else 'Published'} {event.url}")
@@ -0,0 +1,118 @@
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    event_id  TEXT PRIMARY KEY,
+    updated   INTEGER NOT NULL,
+    magnitude REAL,
+    latitude  REAL,
+    longitude REAL,
+    depth     REAL,
+    posted_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_posted_at ON events (posted_at);
+CREATE TABLE IF NOT EXISTS aliases (
+    alias    TEXT PRIMARY KEY,
+    event_id TEXT NOT NULL REFERENCES events (event_id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS aliases_event_id ON aliases (event_id);
+CREATE TABLE IF NOT EXISTS messages (
+    event_id   TEXT NOT NULL REFERENCES events (event_id) ON DELETE CASCADE,
+    chat_id    TEXT NOT NULL,
+    message_id INTEGER NOT NULL,
+    kind       TEXT NOT NULL,
+    PRIMARY KEY (event_id, chat_id)
+);
+"""
+
+
+class PostRegistry:
+    """SQLite record of posted events and the Telegram messages they went out in.
+
+    Events are looked up by any of their USGS IDs through the indexed
+    ``aliases`` table, so checking a feed for revisions costs one primary key
+    lookup per feature regardless of how much history is stored. Rows older
+    than ``retention_days`` are pruned.
+    """
+
+    def __init__(self, path, retention_days=30):
+        self.path = path
+        self.retention_ms = int(retention_days * 24 * 3600 * 1000)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+        self._last_prune = 0
+        self.prune()
+
+    def find(self, ids):
+        """Return the tracked event matching any of the given IDs, or None."""
+        ids = list(ids)
+        placeholders = ",".join("?" * len(ids))
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT e.event_id, e.updated, e.magnitude, e.latitude, e.longitude, e.depth "
+                f"FROM aliases a JOIN events e ON e.event_id = a.event_id "
+                f"WHERE a.alias IN ({placeholders}) LIMIT 1",
+                ids
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("event_id", "updated", "magnitude", "latitude", "longitude", "depth")
+        return dict(zip(keys, row))
+
+    def record_event(self, event):
+        """Start tracking an event, or refresh its stored parameters."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    "INSERT INTO events (event_id, updated, magnitude, latitude, longitude, depth, posted_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (event_id) DO UPDATE SET updated = excluded.updated, "
+                    "magnitude = excluded.magnitude, latitude = excluded.latitude, "
+                    "longitude = excluded.longitude, depth = excluded.depth",
+                    (event.id, event.updated, event.magnitude, event.latitude, event.longitude,
+                     event.depth, int(time.time() * 1000))
+                )
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO aliases (alias, event_id) VALUES (?, ?)",
+                    [(alias, event.id) for alias in set(event.ids) | {event.id}]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if time.time() - self._last_prune > 3600:
+            self.prune()
+
+    def record_message(self, event_id, chat_id, message_id, kind):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO messages (event_id, chat_id, message_id, kind) VALUES (?, ?, ?, ?)",
+                (event_id, str(chat_id), message_id, kind)
+            )
+
+    def messages(self, event_id):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chat_id, message_id, kind FROM messages WHERE event_id = ?", (event_id,)
+            ).fetchall()
+        return [{"chat_id": r[0], "message_id": r[1], "kind": r[2]} for r in rows]
+
+    def prune(self):
+        cutoff = int(time.time() * 1000) - self.retention_ms
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM events WHERE posted_at < ?", (cutoff,)).rowcount
+        self._last_prune = time.time()
+        if deleted:
+            logger.info(f"Pruned {deleted} tracked event(s) older than retention window")
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,311 @@
+"""
+Replay Harness
+Runs recorded or synthetic USGS feeds through the whole monitor (feed poll,
+enrichment, map, render, Telegram publishing) against local stand-ins for
+USGS, Yandex static maps and the Telegram Bot API, then reports throughput,
+per-stage p50/p99 latency and peak RSS.
+
+    python replay.py --swarm 300                        # synthetic swarm of 300 events
+    python replay.py --feed all_day.geojson --mode async
+    python replay.py --swarm 200 --latency-ms 50        # add latency to every stand-in
+
+All state (seen events, posted messages, history, map cache) goes to a
+temporary directory, removed afterwards unless ``--keep`` is given, so a
+replay never touches the real files or network.
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import logging
+import math
+import os
+import random
+import resource
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger("replay")
+
+
+def synthetic_swarm(count, latitude=38.3, longitude=142.4, spread_km=150, start_ms=None, seed=1):
+    """Generate a swarm of features around one point, magnitudes roughly following Gutenberg-Richter."""
+    rng = random.Random(seed)
+    start_ms = start_ms or int(time.time() * 1000)
+    features = []
+    for i in range(count):
+        distance = spread_km * math.sqrt(rng.random())
+        angle = rng.uniform(0, 2 * math.pi)
+        lat = latitude + distance / 111.2 * math.cos(angle)
+        lon = longitude + distance / (111.2 * math.cos(math.radians(latitude))) * math.sin(angle)
+        magnitude = round(min(4.0 + rng.expovariate(math.log(10)), 7.5), 1)
+        event_time = start_ms - (count - i) * 1000
+        features.append({
+            "type": "Feature",
+            "id": f"rp{i:05d}",
+            "properties": {
+                "mag": magnitude,
+                "place": f"{distance:.0f} km from the swarm center",
+                "time": event_time,
+                "updated": event_time,
+                "ids": f",rp{i:05d},",
+            },
+            "geometry": {"type": "Point", "coordinates": [lon, lat, round(rng.uniform(5, 60), 1)]},
+        })
+    return features
+
+
+def load_feed(path):
+    with open(path, "r") as f:
+        return json.load(f)["features"]
+
+
+class StandIns:
+    """One local HTTP server playing USGS (feed, detail, geoserve), Yandex and Telegram."""
+
+    def __init__(self, features, latency=0.0):
+        self.latency = latency
+        self.details = {}
+        self.feed = None
+        self.requests = {}
+        self._lock = threading.Lock()
+        self._images = {}
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._load(features)
+
+    def _load(self, features):
+        for feature in features:
+            props = feature["properties"]
+            props["url"] = f"{self.url}/event/{feature['id']}"
+            props.setdefault("title", f"M {props['mag']} - {props.get('place')}")
+            self.details[feature["id"]] = feature
+        self.feed = json.dumps({"type": "FeatureCollection", "features": features}).encode("utf-8")
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="replay-http", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+    def count(self, name):
+        with self._lock:
+            self.requests[name] = self.requests.get(name, 0) + 1
+
+    def map_image(self, size):
+        with self._lock:
+            if size not in self._images:
+                from PIL import Image
+                image = Image.new("RGB", size, "#cfd8dc")
+                buffer = io.BytesIO()
+                image.save(buffer, "PNG")
+                self._images[size] = buffer.getvalue()
+            return self._images[size]
+
+    def _handler(self):
+        stand_ins = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def reply(self, body, content_type="application/json", status=200):
+                if isinstance(body, (dict, list)):
+                    body = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if stand_ins.latency:
+                    time.sleep(stand_ins.latency)
+                url = urlparse(self.path)
+                params = parse_qs(url.query)
+                if url.path == "/feed":
+                    stand_ins.count("usgs_feed")
+                    self.reply(stand_ins.feed)
+                elif url.path.startswith("/detail/"):
+                    stand_ins.count("usgs_detail")
+                    event_id = url.path[len("/detail/"):].split(".")[0]
+                    if event_id in stand_ins.details:
+                        self.reply(stand_ins.details[event_id])
+                    else:
+                        self.reply({"error": "not found"}, status=404)
+                elif url.path == "/geoserve/places":
+                    stand_ins.count("geoserve")
+                    lat, lon = float(params["latitude"][0]), float(params["longitude"][0])
+                    places = [{
+                        "properties": {
+                            "name": f"Town {i}", "admin1_name": "Replay", "distance": 10.0 * (i + 1),
+                            "azimuth": 45.0 * i, "population": 10000 * (5 - i),
+                            "latitude": lat, "longitude": lon,
+                        }
+                    } for i in range(5)]
+                    self.reply({"event": {"features": places}})
+                elif url.path == "/yandex":
+                    stand_ins.count("yandex")
+                    width, height = map(int, params.get("size", ["600,450"])[0].split(","))
+                    self.reply(stand_ins.map_image((width, height)), "image/png")
+                else:
+                    self.reply({"error": "not found"}, status=404)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if stand_ins.latency:
+                    time.sleep(stand_ins.latency)
+                method = self.path.rsplit("/", 1)[-1]
+                stand_ins.count(f"telegram_{method}")
+                if method == "sendMediaGroup":
+                    result = [{"message_id": i} for i in range(body.count(b"attach://"))]
+                else:
+                    result = {"message_id": 1}
+                self.reply({"ok": True, "result": result})
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))]
+
+
+def configure(stand_ins, workdir, args):
+    """Point every setting at the stand-ins and the temporary directory; must run before importing eq2."""
+    settings = {
+        "USGS_API_URL": f"{stand_ins.url}/feed",
+        "USGS_FEED_MODE": "summary",
+        "USGS_DETAIL_URL": f"{stand_ins.url}/detail/{{event_id}}.geojson",
+        "GEOSERVE_PLACES_URL": f"{stand_ins.url}/geoserve/places",
+        "YANDEX_MAPS_URL": f"{stand_ins.url}/yandex",
+        "TELEGRAM_API_URL": stand_ins.url,
+        "TELEGRAM_TOKEN": "replay",
+        "TELEGRAM_CHANNEL_ID": "@replay",
+        "TELEGRAM_GLOBAL_RATE": "100000",
+        "TELEGRAM_CHAT_RATE_PER_MINUTE": "6000000",
+        "TELEGRAM_BATCH_MODE": "none",
+        "SELENIUM_FALLBACK": "false",
+        "MAP_BACKEND": "yandex",
+        "MAGNITUDE_THRESHOLD": str(args.min_magnitude),
+        "PIPELINE_MODE": args.mode,
+        "STATE_FILE": os.path.join(workdir, "state.json"),
+        "POSTS_DB_FILE": os.path.join(workdir, "posts.db"),
+        "HISTORY_DB_FILE": os.path.join(workdir, "history.db"),
+        "MAP_CACHE_DIR": os.path.join(workdir, "map_cache"),
+        "SUBSCRIPTIONS_FILE": os.path.join(workdir, "subscriptions.json"),
+        "METRICS_PORT": "0",
+    }
+    if args.real_rate_limits:
+        for name in ("TELEGRAM_GLOBAL_RATE", "TELEGRAM_CHAT_RATE_PER_MINUTE"):
+            del settings[name]
+    os.environ.update(settings)
+
+
+def run(args):
+    features = []
+    for path in args.feed or []:
+        features.extend(load_feed(path))
+    if args.swarm:
+        features.extend(synthetic_swarm(args.swarm))
+    stand_ins = StandIns(features, args.latency_ms / 1000).start()
+    workdir = tempfile.mkdtemp(prefix="eq-replay-")
+    configure(stand_ins, workdir, args)
+
+    import eq2
+    import metrics
+    import monolith
+    from pipeline import Pipeline
+
+    samples = {}
+    sent = threading.Semaphore(0)
+
+    def on_stage(stage, seconds, event):
+        samples.setdefault(stage, []).append(seconds)
+        if stage == "send":
+            sent.release()
+
+    metrics.stage_listeners.append(on_stage)
+    # A non-empty index, so the first poll processes the whole feed instead of seeding
+    eq2.seen_events.add({"id": "replay-seed", "properties": {}})
+
+    started = time.monotonic()
+    if args.mode == "async":
+        events = []
+
+        def collect():
+            batch = eq2.collect_new_events()
+            events.extend(batch)
+            return batch
+
+        async def replay():
+            pipeline = Pipeline(
+                collect, poll_interval=0.5,
+                queue_size=eq2.PIPELINE_QUEUE_SIZE,
+                enrich_workers=eq2.PIPELINE_ENRICH_WORKERS,
+                map_workers=eq2.PIPELINE_MAP_WORKERS,
+                render_workers=eq2.PIPELINE_RENDER_WORKERS,
+                publish_workers=eq2.PIPELINE_PUBLISH_WORKERS
+            )
+            task = asyncio.create_task(pipeline.run())
+            while not events:
+                await asyncio.sleep(0.05)
+            for _ in events:
+                if not await asyncio.to_thread(sent.acquire, timeout=args.timeout):
+                    logger.error("Timed out waiting for posts")
+                    break
+            task.cancel()
+
+        asyncio.run(replay())
+        processed = len(events)
+    else:
+        eq2.check_earthquakes()
+        monolith.get_sender().flush(args.timeout)
+        processed = len(samples.get("send", []))
+    elapsed = time.monotonic() - started
+    stand_ins.stop()
+
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"Replayed {processed} events ({len(features)} in feed) in {elapsed:.2f} s "
+          f"({processed / elapsed if elapsed else 0:.1f} events/s), mode {args.mode}")
+    print(f"{'stage':<12}{'count':>7}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for stage in ("feed_fetch", "feed_parse", "enrich", "map", "render", "send"):
+        values = samples.get(stage)
+        if not values:
+            continue
+        print(f"{stage:<12}{len(values):>7}{percentile(values, 0.5) * 1000:>10.1f}"
+              f"{percentile(values, 0.99) * 1000:>10.1f}{max(values) * 1000:>10.1f}")
+    print(f"Stand-in requests: {json.dumps(stand_ins.requests, sort_keys=True)}")
+    print(f"Peak RSS: {peak_rss_mb:.1f} MB")
+    if args.keep:
+        print(f"Work directory: {workdir}")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay earthquake feeds through the monitor")
+    parser.add_argument("--feed", action="append", help="Recorded USGS GeoJSON feed (repeatable)")
+    parser.add_argument("--swarm", type=int, default=0, help="Number of synthetic swarm events to add")
+    parser.add_argument("--mode", choices=("serial", "async"), default="serial")
+    parser.add_argument("--min-magnitude", type=float, default=4.0)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Delay added to every stand-in response")
+    parser.add_argument("--real-rate-limits", action="store_true", help="Keep the configured Telegram rate limits")
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds to wait for posts to be sent")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary work directory")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+    if not args.feed and not args.swarm:
+        args.swarm = 300
+    logging.basicConfig(
+        level=args.log_level.upper(),
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    run(args)
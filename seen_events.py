@@ -0,0 +1,65 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def event_ids(feature):
+    """Return every USGS ID a feed feature is known under.
+
+    A single earthquake may be reported by several networks, and its preferred
+    ID can change between feed updates, so all IDs from ``properties.ids`` are
+    checked, not only ``feature["id"]``.
+    """
+    ids = {feature["id"]}
+    extra = feature["properties"].get("ids") or ""
+    ids.update(i for i in extra.split(",") if i)
+    return ids
+
+
+class SeenEventIndex:
+    """Set of already processed USGS event IDs.
+
+    IDs are kept in a dict keyed by event ID (value is the event time in
+    milliseconds, as in the USGS feed), so membership checks are O(1) no matter
+    how large the feed is. Entries older than ``retention_hours`` are evicted
+    when the index is serialized, which keeps it bounded as long as the
+    retention is longer than the time window of the feed being polled.
+    """
+
+    def __init__(self, retention_hours, events=None):
+        self.retention_ms = int(retention_hours * 3600 * 1000)
+        self._events = {k: int(v) for k, v in (events or {}).items()}
+        logger.info(f"Loaded {len(self._events)} seen events")
+
+    def __len__(self):
+        return len(self._events)
+
+    def __contains__(self, event_id):
+        return event_id in self._events
+
+    def is_empty(self):
+        return not self._events
+
+    def is_seen(self, feature):
+        return any(i in self._events for i in event_ids(feature))
+
+    def add(self, feature):
+        event_time = int(feature["properties"].get("time") or time.time() * 1000)
+        for i in event_ids(feature):
+            self._events[i] = event_time
+
+    def evict(self, now_ms=None):
+        if now_ms is None:
+            now_ms = int(time.time() * 1000)
+        cutoff = now_ms - self.retention_ms
+        stale = [k for k, v in self._events.items() if v < cutoff]
+        for k in stale:
+            del self._events[k]
+        if stale:
+            logger.debug(f"Evicted {len(stale)} events older than retention window")
+        return len(stale)
+
+    def to_dict(self):
+        self.evict()
+        return dict(self._events)
@@ -0,0 +1,54 @@
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+class StateStore:
+    """Durable monitor state kept in a single JSON document.
+
+    Every component stores its state under its own section. ``save`` writes
+    the whole document to a temporary file, fsyncs it and atomically renames
+    it over the old one, so a crash leaves either the previous or the new
+    state on disk, never a partial file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._data = {}
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            logger.info(f"State file {self.path} not found, starting with empty state")
+            return
+        try:
+            with open(self.path, "r") as f:
+                self._data = json.load(f)
+            logger.info(f"Loaded state from {self.path}")
+        except (ValueError, OSError) as e:
+            logger.error(f"Failed to load state file {self.path}: {str(e)}")
+            self._data = {}
+
+    def get(self, section, default=None):
+        return self._data.get(section, default)
+
+    def set(self, section, value):
+        self._data[section] = value
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        # Persist the rename itself
+        dir_fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(dir_fd)
@@ -0,0 +1,166 @@
+"""
+Subscriptions
+Routes events to the Telegram chats whose regions and magnitude thresholds
+they match.
+
+Subscriptions are read from a JSON file, a list of subscribers:
+
+    [
+        {
+            "chat_id": "@JapanQuakes",
+            "regions": [
+                {"name": "Japan", "type": "circle", "latitude": 36.2, "longitude": 138.3,
+                 "radius_km": 800, "min_magnitude": 4.0},
+                {"name": "Kuril Islands", "type": "polygon", "min_magnitude": 5.0,
+                 "coordinates": [[145.0, 43.0], [157.0, 51.0], [160.0, 49.0], [148.0, 42.0]]}
+            ]
+        },
+        {"chat_id": "@BigQuakes", "regions": [{"type": "world", "min_magnitude": 6.0}]}
+    ]
+
+Polygon coordinates are [longitude, latitude] pairs within -180..180. Each
+edge takes the shorter way around, so polygons may cross the antimeridian:
+[[175, -14], [-172, -14], [-172, -24], [175, -24]] covers Fiji and Tonga.
+Polygons that go all the way around a pole are rejected.
+
+Regions are indexed in a grid of ``cell_deg`` cells: each cell lists the
+regions whose bounding box overlaps it, sorted by magnitude threshold;
+worldwide regions are kept in one separate list. An event only visits the
+regions of its own cell and the worldwide ones, stops at the first one whose
+threshold is above its magnitude, and runs the exact circle or polygon test
+on what remains.
+"""
+
+import json
+import logging
+import math
+
+from history import bounding_boxes, haversine_km
+
+logger = logging.getLogger(__name__)
+
+
+def point_in_polygon(longitude, latitude, polygon):
+    """Ray casting test for a point against a ring of [lon, lat] pairs."""
+    inside = False
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        xi, yi = polygon[i][:2]
+        xj, yj = polygon[j][:2]
+        if (yi > latitude) != (yj > latitude):
+            if longitude < (xj - xi) * (latitude - yi) / (yj - yi) + xi:
+                inside = not inside
+        j = i
+    return inside
+
+
+def unwrap_ring(ring):
+    """Shift longitudes so that no edge of a ring spans more than 180 degrees.
+
+    Rings crossing the antimeridian come out continuous, reaching past 180 or
+    -180. Raises ValueError for a ring that goes all the way around a pole.
+    """
+    unwrapped = [ring[0]]
+    for longitude, latitude in ring[1:]:
+        longitude += 360 * round((unwrapped[-1][0] - longitude) / 360)
+        unwrapped.append((longitude, latitude))
+    if abs(unwrapped[0][0] - unwrapped[-1][0]) > 180:
+        raise ValueError("Polygons around a pole are not supported")
+    return unwrapped
+
+
+class Region:
+    def __init__(self, chat_id, order, spec):
+        self.chat_id = chat_id
+        # Position of the subscriber in the file, so routes come out in a stable order
+        self.order = order
+        self.name = spec.get("name") or spec["type"]
+        self.kind = spec["type"]
+        self.min_magnitude = float(spec.get("min_magnitude", 0))
+        if self.kind == "circle":
+            self.latitude = float(spec["latitude"])
+            self.longitude = float(spec["longitude"])
+            self.radius_km = float(spec["radius_km"])
+        elif self.kind == "polygon":
+            self.polygon = unwrap_ring([(float(lon), float(lat)) for lon, lat in spec["coordinates"]])
+        elif self.kind != "world":
+            raise ValueError(f"Unknown region type: {self.kind}")
+
+    def boxes(self):
+        """Return (min_lon, max_lon, min_lat, max_lat) boxes covering the region."""
+        if self.kind == "circle":
+            return bounding_boxes(self.latitude, self.longitude, self.radius_km)
+        if self.kind == "polygon":
+            lons = [p[0] for p in self.polygon]
+            lats = [p[1] for p in self.polygon]
+            if max(lons) - min(lons) >= 360:
+                return [(-180.0, 180.0, min(lats), max(lats))]
+            # Split polygons reaching past the antimeridian into one box on each side
+            boxes = []
+            for shift in (-360, 0, 360):
+                min_lon, max_lon = max(min(lons) + shift, -180.0), min(max(lons) + shift, 180.0)
+                if min_lon <= max_lon:
+                    boxes.append((min_lon, max_lon, min(lats), max(lats)))
+            return boxes
+        return [(-180.0, 180.0, -90.0, 90.0)]
+
+    def contains(self, latitude, longitude):
+        if self.kind == "circle":
+            return haversine_km(self.latitude, self.longitude, latitude, longitude) <= self.radius_km
+        if self.kind == "polygon":
+            # Unwrapped polygons may reach past the antimeridian, so also try the point a turn away
+            return any(point_in_polygon(longitude + shift, latitude, self.polygon) for shift in (0, 360, -360))
+        return True
+
+
+class SubscriptionIndex:
+    def __init__(self, subscribers, cell_deg=2.0):
+        self.cell_deg = cell_deg
+        self.grid_w = int(math.ceil(360 / cell_deg))
+        self.grid_h = int(math.ceil(180 / cell_deg))
+        self.regions = []
+        for order, subscriber in enumerate(subscribers):
+            for spec in subscriber["regions"]:
+                self.regions.append(Region(subscriber["chat_id"], order, spec))
+        self.chat_ids = list(dict.fromkeys(r.chat_id for r in self.regions))
+        self.min_magnitude = min((r.min_magnitude for r in self.regions), default=None)
+        self._cells = {}
+        # Worldwide regions match everywhere and are kept out of the grid
+        self._world = sorted((r for r in self.regions if r.kind == "world"), key=lambda r: r.min_magnitude)
+        for region in self.regions:
+            if region.kind == "world":
+                continue
+            for min_lon, max_lon, min_lat, max_lat in region.boxes():
+                col0, row0 = self._cell(min_lon, min_lat)
+                col1, row1 = self._cell(max_lon, max_lat)
+                for row in range(row0, row1 + 1):
+                    for col in range(col0, col1 + 1):
+                        self._cells.setdefault(row * self.grid_w + col, []).append(region)
+        for regions in self._cells.values():
+            regions.sort(key=lambda r: r.min_magnitude)
+        logger.info(f"Loaded {len(self.regions)} subscription region(s) for {len(self.chat_ids)} chat(s)")
+
+    def _cell(self, longitude, latitude):
+        col = min(self.grid_w - 1, max(0, int((longitude + 180) // self.cell_deg)))
+        row = min(self.grid_h - 1, max(0, int((latitude + 90) // self.cell_deg)))
+        return col, row
+
+    def route(self, latitude, longitude, magnitude):
+        """Return the chat IDs subscribed to an event, in subscription file order."""
+        if magnitude is None:
+            return []
+        col, row = self._cell(longitude, latitude)
+        matched = {}
+        for regions in (self._world, self._cells.get(row * self.grid_w + col, ())):
+            for region in regions:
+                if region.min_magnitude > magnitude:
+                    break
+                if region.chat_id not in matched and region.contains(latitude, longitude):
+                    matched[region.chat_id] = region.order
+        return sorted(matched, key=matched.get)
+
+
+def load_subscriptions(path, cell_deg=2.0):
+    """Load the subscription index from a JSON file."""
+    with open(path, "r", encoding="utf-8") as f:
+        return SubscriptionIndex(json.load(f), cell_deg)
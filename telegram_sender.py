@@ -0,0 +1,354 @@
+"""
+Telegram Sender
+Outbound queue for Telegram Bot API posts.
+
+One HTTP session is shared by all requests. Every chat gets its own queue
+and worker thread, so fan-out to several channels happens in parallel, while
+token buckets keep each chat and the bot as a whole under Telegram's rate
+limits. A worker exits after its chat has been idle for ``worker_idle``
+seconds and the next post starts a new one, so rarely used chats do not each
+hold a thread. 429 responses are retried after the ``retry_after`` Telegram
+asks for, and network errors or 5xx responses are retried with exponential
+backoff. When several posts for one chat are waiting, text posts can be
+coalesced into a single digest message, or posts with maps into a media
+group. Messages sent earlier can be edited in place when an event is revised.
+"""
+
+import json
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import requests
+
+from metrics import telegram_call_seconds
+
+logger = logging.getLogger(__name__)
+
+# Telegram limits for one message
+MAX_TEXT_LENGTH = 4096
+MAX_MEDIA_GROUP = 10
+
+
+class TelegramError(Exception):
+    def __init__(self, method, status, description):
+        super().__init__(f"Telegram {method} failed: {status} {description}")
+        self.status = status
+        self.description = description
+
+
+class TokenBucket:
+    """Thread-safe token bucket: ``rate`` tokens per second, bursts up to ``capacity``."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class Post:
+    """One message to publish; ``photo`` is encoded image bytes or None.
+
+    Once sent, ``kind`` tells how the post went out ("photo", "text" or
+    "digest") and ``future`` resolves to the Telegram message dict.
+    """
+
+    def __init__(self, text, photo=None):
+        self.text = text
+        self.photo = photo
+        self.kind = None
+        self.future = Future()
+
+    def sent(self, kind, message):
+        self.kind = kind
+        self.future.set_result(message)
+
+
+def photo_filename(photo):
+    if photo.startswith(b"\xff\xd8"):
+        return "map.jpg", "image/jpeg"
+    if photo[:4] == b"RIFF" and photo[8:12] == b"WEBP":
+        return "map.webp", "image/webp"
+    return "map.png", "image/png"
+
+
+class TelegramSender:
+    def __init__(self, token, api_url="https://api.telegram.org", global_rate=30,
+                 chat_rate_per_minute=20, max_retries=5, timeout=30,
+                 batch_mode="none", batch_window=2.0, batch_max=MAX_MEDIA_GROUP,
+                 worker_idle=60):
+        if batch_mode not in ("none", "digest", "media_group"):
+            raise ValueError(f"Unknown batch mode: {batch_mode}")
+        self.base_url = f"{api_url.rstrip('/')}/bot{token}"
+        self.session = requests.Session()
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate_per_minute / 60
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.batch_mode = batch_mode
+        self.batch_window = batch_window
+        self.batch_max = min(batch_max, MAX_MEDIA_GROUP)
+        self.worker_idle = worker_idle
+        self._chats = {}
+        self._lock = threading.Lock()
+
+    # Bot API calls
+
+    def call(self, method, data=None, files=None, chat_bucket=None):
+        """Call a Bot API method, honouring rate limits and retrying transient failures."""
+        delay = 1
+        for attempt in range(self.max_retries + 1):
+            if chat_bucket:
+                chat_bucket.acquire()
+            self.global_bucket.acquire()
+            started = time.monotonic()
+            try:
+                response = self.session.post(
+                    f"{self.base_url}/{method}", data=data, files=files, timeout=self.timeout
+                )
+            except requests.RequestException as e:
+                telegram_call_seconds.observe(time.monotonic() - started, method=method, status="error")
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"Telegram {method} request failed ({str(e)}), retrying in {delay} s")
+                time.sleep(delay)
+                delay *= 2
+                continue
+            telegram_call_seconds.observe(time.monotonic() - started, method=method, status=str(response.status_code))
+            try:
+                body = response.json()
+            except ValueError:
+                body = {"ok": False, "description": response.text}
+            if response.status_code == 200 and body.get("ok"):
+                return body["result"]
+            if response.status_code == 429 and attempt < self.max_retries:
+                retry_after = body.get("parameters", {}).get("retry_after", delay)
+                logger.warning(f"Telegram rate limit hit on {method}, retrying in {retry_after} s")
+                time.sleep(retry_after)
+                continue
+            if response.status_code >= 500 and attempt < self.max_retries:
+                logger.warning(f"Telegram {method} returned {response.status_code}, retrying in {delay} s")
+                time.sleep(delay)
+                delay *= 2
+                continue
+            raise TelegramError(method, response.status_code, body.get("description"))
+
+    def send_message(self, chat_id, text, chat_bucket=None):
+        return self.call("sendMessage", {
+            "chat_id": chat_id,
+            "text": text,
+            "parse_mode": "HTML",
+        }, chat_bucket=chat_bucket)
+
+    def send_photo(self, chat_id, photo, caption, chat_bucket=None):
+        name, mime = photo_filename(photo)
+        return self.call("sendPhoto", {
+            "chat_id": chat_id,
+            "caption": caption,
+            "parse_mode": "HTML",
+        }, files={"photo": (name, photo, mime)}, chat_bucket=chat_bucket)
+
+    def send_media_group(self, chat_id, posts, chat_bucket=None):
+        media, files = [], {}
+        for i, post in enumerate(posts):
+            name, mime = photo_filename(post.photo)
+            files[f"photo{i}"] = (name, post.photo, mime)
+            media.append({
+                "type": "photo",
+                "media": f"attach://photo{i}",
+                "caption": post.text,
+                "parse_mode": "HTML",
+            })
+        return self.call("sendMediaGroup", {
+            "chat_id": chat_id,
+            "media": json.dumps(media),
+        }, files=files, chat_bucket=chat_bucket)
+
+    def edit_message_text(self, chat_id, message_id, text, chat_bucket=None):
+        return self.call("editMessageText", {
+            "chat_id": chat_id,
+            "message_id": message_id,
+            "text": text,
+            "parse_mode": "HTML",
+        }, chat_bucket=chat_bucket)
+
+    def edit_message_caption(self, chat_id, message_id, caption, chat_bucket=None):
+        return self.call("editMessageCaption", {
+            "chat_id": chat_id,
+            "message_id": message_id,
+            "caption": caption,
+            "parse_mode": "HTML",
+        }, chat_bucket=chat_bucket)
+
+    def edit_message_media(self, chat_id, message_id, photo, caption, chat_bucket=None):
+        name, mime = photo_filename(photo)
+        return self.call("editMessageMedia", {
+            "chat_id": chat_id,
+            "message_id": message_id,
+            "media": json.dumps({
+                "type": "photo",
+                "media": "attach://photo",
+                "caption": caption,
+                "parse_mode": "HTML",
+            }),
+        }, files={"photo": (name, photo, mime)}, chat_bucket=chat_bucket)
+
+    # Outbound queue
+
+    def publish(self, chat_ids, text, photo=None):
+        """Queue a post for every chat and return {chat_id: Post}.
+
+        Each post's future resolves to the Telegram message dict it ended up in.
+        """
+        posts = {}
+        for chat_id in chat_ids:
+            post = Post(text, photo)
+            with self._lock:
+                chat = self._chat(chat_id)
+                chat["queue"].put(post)
+                # The worker only exits under the same lock after finding the queue empty
+                if chat["thread"] is None:
+                    chat["thread"] = threading.Thread(
+                        target=self._worker, args=(chat["chat_id"], chat),
+                        name=f"telegram-{chat['chat_id']}", daemon=True
+                    )
+                    chat["thread"].start()
+            posts[chat_id] = post
+        return posts
+
+    def edit(self, chat_id, message_id, kind, text, photo=None):
+        """Replace the content of a message sent earlier as a post of the given kind.
+
+        Photo posts get the new photo and caption, text posts the new text.
+        Digest messages hold several posts and are left alone. Runs in the
+        calling thread, within the chat's rate limit.
+        """
+        with self._lock:
+            bucket = self._chat(chat_id)["bucket"]
+        try:
+            if kind == "photo" and photo:
+                return self.edit_message_media(chat_id, message_id, photo, text, bucket)
+            if kind == "photo":
+                return self.edit_message_caption(chat_id, message_id, text, bucket)
+            if kind == "text":
+                return self.edit_message_text(chat_id, message_id, text, bucket)
+        except TelegramError as e:
+            if e.status == 400 and "not modified" in (e.description or ""):
+                return None
+            raise
+        logger.info(f"Not editing {kind} message {message_id} in {chat_id}")
+        return None
+
+    def flush(self, timeout=None):
+        """Wait until every queued post has been sent or has failed."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            chats = list(self._chats.values())
+        for chat in chats:
+            with chat["queue"].all_tasks_done:
+                while chat["queue"].unfinished_tasks:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    chat["queue"].all_tasks_done.wait(remaining)
+        return True
+
+    def _chat(self, chat_id):
+        """Return the queue and rate limit state of a chat; call with ``_lock`` held.
+
+        Chat IDs are keyed as strings, so an int ID from the subscriptions
+        file and the same ID read back from the post registry share a bucket.
+        """
+        chat_id = str(chat_id)
+        if chat_id not in self._chats:
+            self._chats[chat_id] = {
+                "chat_id": chat_id,
+                "queue": queue.Queue(),
+                "bucket": TokenBucket(self.chat_rate, 1),
+                "thread": None,
+            }
+        return self._chats[chat_id]
+
+    def _take_batch(self, posts_queue):
+        posts = [posts_queue.get(timeout=self.worker_idle)]
+        if self.batch_mode == "none":
+            return posts
+        deadline = time.monotonic() + self.batch_window
+        while len(posts) < self.batch_max:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                posts.append(posts_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return posts
+
+    def _worker(self, chat_id, chat):
+        while True:
+            try:
+                posts = self._take_batch(chat["queue"])
+            except queue.Empty:
+                with self._lock:
+                    if chat["queue"].empty():
+                        chat["thread"] = None
+                        return
+                continue
+            try:
+                self._send_batch(chat_id, posts, chat["bucket"])
+            except Exception as e:
+                logger.error(f"Failed to send {len(posts)} post(s) to {chat_id}: {str(e)}")
+                for post in posts:
+                    if not post.future.done():
+                        post.future.set_exception(e)
+            finally:
+                for post in posts:
+                    if not post.future.done():
+                        post.future.set_exception(TelegramError("send", None, "no message returned for post"))
+                    chat["queue"].task_done()
+
+    def _send_batch(self, chat_id, posts, bucket):
+        if len(posts) > 1 and self.batch_mode == "media_group":
+            with_photo = [p for p in posts if p.photo]
+            if len(with_photo) > 1:
+                logger.info(f"Sending media group of {len(with_photo)} posts to {chat_id}")
+                messages = self.send_media_group(chat_id, with_photo, bucket)
+                for post, message in zip(with_photo, messages):
+                    post.sent("photo", message)
+                posts = [p for p in posts if not p.photo]
+                if not posts:
+                    return
+        if len(posts) > 1 and self.batch_mode == "digest":
+            # Only text posts are merged; posts with maps keep their photo and go out on their own
+            text_only = [p for p in posts if p.photo is None]
+            digest = "\n\n".join(p.text for p in text_only)
+            if len(text_only) > 1 and len(digest) <= MAX_TEXT_LENGTH:
+                logger.info(f"Sending digest of {len(text_only)} posts to {chat_id}")
+                message = self.send_message(chat_id, digest, bucket)
+                for post in text_only:
+                    post.sent("digest", message)
+                posts = [p for p in posts if p.photo is not None]
+                if not posts:
+                    return
+        for post in posts:
+            if post.photo:
+                post.sent("photo", self.send_photo(chat_id, post.photo, post.text, bucket))
+            else:
+                post.sent("text", self.send_message(chat_id, post.text, bucket))
+        logger.info(f"Sent {len(posts)} post(s) to {chat_id}")
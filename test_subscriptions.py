@@ -0,0 +1,48 @@
+"""
+Tests for routing events to subscribers by region.
+
+    python -m pytest test_subscriptions.py
+"""
+
+import unittest
+
+from subscriptions import Region, SubscriptionIndex
+
+TONGA = [[175, -14], [-172, -14], [-172, -24], [175, -24]]
+KURILS = [[145.0, 43.0], [157.0, 51.0], [160.0, 49.0], [148.0, 42.0]]
+
+
+class SubscriptionIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = SubscriptionIndex([
+            {"chat_id": "@tonga", "regions": [{"type": "polygon", "coordinates": TONGA}]},
+            {"chat_id": "@kurils", "regions": [{"type": "polygon", "coordinates": KURILS, "min_magnitude": 5.0}]},
+            {"chat_id": "@japan", "regions": [
+                {"type": "circle", "latitude": 36.2, "longitude": 138.3, "radius_km": 800, "min_magnitude": 4.0}
+            ]},
+            {"chat_id": "@big", "regions": [{"type": "world", "min_magnitude": 6.0}]},
+        ])
+
+    def test_polygon_across_antimeridian(self):
+        self.assertEqual(self.index.route(-20, -175, 5.0), ["@tonga"])
+        self.assertEqual(self.index.route(-18, 178, 5.0), ["@tonga"])
+        self.assertEqual(self.index.route(-20, -70, 5.0), [])
+        self.assertEqual(self.index.route(-20, 0, 5.0), [])
+
+    def test_antimeridian_polygon_is_split_into_boxes(self):
+        region = Region("@tonga", 0, {"type": "polygon", "coordinates": TONGA})
+        self.assertEqual(sorted(region.boxes()), [(-180.0, -172.0, -24.0, -14.0), (175.0, 180.0, -24.0, -14.0)])
+
+    def test_polygon_around_pole_is_rejected(self):
+        with self.assertRaises(ValueError):
+            Region("@arctic", 0, {"type": "polygon", "coordinates": [[0, 80], [120, 80], [-120, 80]]})
+
+    def test_magnitude_thresholds_and_order(self):
+        self.assertEqual(self.index.route(46, 150, 4.5), [])
+        self.assertEqual(self.index.route(46, 150, 5.5), ["@kurils"])
+        self.assertEqual(self.index.route(35.7, 139.7, 6.5), ["@japan", "@big"])
+        self.assertEqual(self.index.route(35.7, 139.7, None), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
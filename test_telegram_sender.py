@@ -0,0 +1,179 @@
+"""
+Tests for the Telegram sender against a local stand-in for the Bot API.
+
+    python -m pytest test_telegram_sender.py
+"""
+
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs
+
+from telegram_sender import TelegramError, TelegramSender
+
+PHOTO = b"\x89PNG\r\n\x1a\n" + b"\x00" * 16
+
+
+class FakeBotAPI:
+    """Bot API stand-in: replies with queued (status, body) responses per method, then with success."""
+
+    def __init__(self):
+        self.requests = []
+        self.responses = {}
+        self._message_id = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def methods(self):
+        return [method for method, _ in self.requests]
+
+    def reply_for(self, method, body):
+        with self._lock:
+            self.requests.append((method, body))
+            queued = self.responses.get(method)
+            if queued:
+                return queued.pop(0)
+            if method == "sendMediaGroup":
+                count = body.count(b"attach://")
+                result = [{"message_id": self._message_id + i + 1} for i in range(count)]
+                self._message_id += count
+            else:
+                self._message_id += 1
+                result = {"message_id": self._message_id}
+            return 200, {"ok": True, "result": result}
+
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                status, reply = api.reply_for(self.path.rsplit("/", 1)[-1], body)
+                payload = json.dumps(reply).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class TelegramSenderTest(unittest.TestCase):
+    def setUp(self):
+        self.api = FakeBotAPI()
+        self.addCleanup(self.api.stop)
+        # Retry delays are recorded instead of slept
+        patcher = mock.patch("telegram_sender.time.sleep")
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sender(self, **kwargs):
+        kwargs.setdefault("global_rate", 1000)
+        kwargs.setdefault("chat_rate_per_minute", 60000)
+        kwargs.setdefault("timeout", 5)
+        return TelegramSender("test", api_url=self.api.url, **kwargs)
+
+    def sleeps(self):
+        return [c.args[0] for c in self.sleep.call_args_list if c.args[0] >= 1]
+
+    def test_rate_limit_waits_for_retry_after(self):
+        self.api.responses["sendMessage"] = [
+            (429, {"ok": False, "error_code": 429, "description": "Too Many Requests",
+                   "parameters": {"retry_after": 7}}),
+        ]
+        message = self.sender().send_message("@chat", "hello")
+        self.assertEqual(message, {"message_id": 1})
+        self.assertEqual(self.api.methods(), ["sendMessage", "sendMessage"])
+        self.assertEqual(self.sleeps(), [7])
+
+    def test_server_errors_back_off_exponentially(self):
+        self.api.responses["sendMessage"] = [
+            (500, {"ok": False, "description": "Internal Server Error"}),
+            (502, {"ok": False, "description": "Bad Gateway"}),
+        ]
+        message = self.sender().send_message("@chat", "hello")
+        self.assertEqual(message, {"message_id": 1})
+        self.assertEqual(len(self.api.requests), 3)
+        self.assertEqual(self.sleeps(), [1, 2])
+
+    def test_gives_up_after_max_retries(self):
+        self.api.responses["sendMessage"] = [(503, {"ok": False, "description": "Unavailable"})] * 3
+        with self.assertRaises(TelegramError) as raised:
+            self.sender(max_retries=2).send_message("@chat", "hello")
+        self.assertEqual(raised.exception.status, 503)
+        self.assertEqual(len(self.api.requests), 3)
+
+    def test_client_errors_are_not_retried(self):
+        self.api.responses["sendMessage"] = [(400, {"ok": False, "description": "Bad Request: chat not found"})]
+        with self.assertRaises(TelegramError) as raised:
+            self.sender().send_message("@chat", "hello")
+        self.assertEqual(raised.exception.status, 400)
+        self.assertEqual(len(self.api.requests), 1)
+
+    def test_digest_merges_text_posts_and_keeps_photos(self):
+        sender = self.sender(batch_mode="digest", batch_window=0.2)
+        first = sender.publish(["@chat"], "first")["@chat"]
+        with_map = sender.publish(["@chat"], "with map", PHOTO)["@chat"]
+        second = sender.publish(["@chat"], "second")["@chat"]
+        self.assertTrue(sender.flush(10))
+
+        self.assertEqual(sorted(self.api.methods()), ["sendMessage", "sendPhoto"])
+        digest = next(body for method, body in self.api.requests if method == "sendMessage")
+        self.assertEqual(parse_qs(digest.decode("utf-8"))["text"], ["first\n\nsecond"])
+        self.assertEqual((first.kind, second.kind, with_map.kind), ("digest", "digest", "photo"))
+        self.assertEqual(first.future.result(), second.future.result())
+        self.assertNotEqual(with_map.future.result(), first.future.result())
+
+    def test_media_group_sends_photos_as_one_album(self):
+        sender = self.sender(batch_mode="media_group", batch_window=0.2)
+        photos = [sender.publish(["@chat"], f"map {i}", PHOTO)["@chat"] for i in range(3)]
+        text = sender.publish(["@chat"], "no map")["@chat"]
+        self.assertTrue(sender.flush(10))
+
+        self.assertEqual(sorted(self.api.methods()), ["sendMediaGroup", "sendMessage"])
+        album = next(body for method, body in self.api.requests if method == "sendMediaGroup")
+        self.assertEqual(album.count(b"attach://"), 3)
+        self.assertEqual([p.kind for p in photos], ["photo"] * 3)
+        self.assertEqual(len({p.future.result()["message_id"] for p in photos}), 3)
+        self.assertEqual(text.kind, "text")
+
+    def test_idle_workers_exit_and_restart(self):
+        sender = self.sender(worker_idle=0.1)
+        first = sender.publish(["@a", "@b"], "first")
+        self.assertTrue(sender.flush(10))
+        workers = [chat["thread"] for chat in sender._chats.values() if chat["thread"]]
+        for worker in workers:
+            worker.join(5)
+        self.assertFalse(any(worker.is_alive() for worker in workers))
+        self.assertEqual([chat["thread"] for chat in sender._chats.values()], [None, None])
+
+        second = sender.publish(["@a"], "second")["@a"]
+        self.assertTrue(sender.flush(10))
+        self.assertEqual(second.kind, "text")
+        self.assertEqual(first["@b"].kind, "text")
+
+    def test_chat_ids_share_one_bucket_whatever_their_type(self):
+        sender = self.sender()
+        sender.publish([-1001234], "post")
+        self.assertTrue(sender.flush(10))
+        with mock.patch.object(sender, "edit_message_text") as edit:
+            sender.edit("-1001234", 1, "text", "edited")
+        self.assertEqual(list(sender._chats), ["-1001234"])
+        self.assertIs(edit.call_args.args[-1], sender._chats["-1001234"]["bucket"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,17 @@
+#!/bin/sh
+# Проверяет SHA-256 загруженного файла: verify_download.sh <файл> <сумма>
+# Без суммы сборка падает, если не задан ALLOW_UNVERIFIED_DOWNLOADS=true
+set -e
+
+file="$1"
+expected="$2"
+
+if [ -n "$expected" ]; then
+    echo "$expected  $file" | sha256sum -c -
+elif [ "$ALLOW_UNVERIFIED_DOWNLOADS" = "true" ]; then
+    echo "WARNING: unverified download $(sha256sum "$file")"
+else
+    echo "No SHA-256 pinned for $(sha256sum "$file")" >&2
+    echo "Pass the digest as a build argument or set ALLOW_UNVERIFIED_DOWNLOADS=true" >&2
+    exit 1
+fi